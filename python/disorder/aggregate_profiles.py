@@ -0,0 +1,286 @@
+#!/usr/bin/python
+
+# Name: Ryan Hagenson
+# Email: rhagenson@unomaha.edu
+
+import sys
+from csv import writer
+from datetime import datetime
+from getopt import GetoptError, getopt
+from os import path, makedirs, walk, listdir
+
+import numpy
+
+from profile_codec import isoform_profiles, load_columns
+
+dataDir = ""  # Default False, should be overwritten at CLI
+profilesName = "profiles"  # The name of the final mutation profile csv's dir
+isoformsSubDirName = "isoforms"
+summarySubDirName = "summary"  # Where the aggregated tables are written
+
+now = datetime.now().strftime("%d-%m-%y")  # Default run time
+disorderCutoff = 0.5  # IUPred scores above this are considered disordered
+
+# Columns shared by every summary table, see summary_columns()
+summaryHeader = ["Positions", "Mutations", "MutatedPositions",
+                 "MutationsPerPosition", "MeanDisorder", "ObservedDisorder",
+                 "DisorderPerMutation", "DisorderedFraction",
+                 "DisorderedMutationFraction"]
+
+# General directory tree within profiles/<now> is:
+# ./<CANCER>/<GENE.long|short>/<GENE.XXX.long|short>.prof  # or .bprof
+# ./summary  # Should be made by script, holds the tables below
+#   isoform_summary.tsv: one row per cancer and isoform
+#   gene_summary.tsv: one row per cancer and GENE.long|short
+#   cancer_summary.tsv: one row per cancer and long|short
+#   isoform_positions.tsv: one row per isoform position, summed over cancers
+
+
+def main():
+    """
+    A simple wrapper for all CLI options
+    """
+    global dataDir, now
+
+    # Enables command-line options via getopt and sys packages
+    try:
+        opts, args = getopt(sys.argv[1:],
+                            'd:',
+                            ["date=", "dataDir="]
+                            )
+    except GetoptError as err:
+        # Redirect STDERR to STDOUT (ensures screen display)
+        sys.stdout = sys.stderr
+        # Print help information
+        print(str(err))
+        # Exit
+        sys.exit(2)
+
+    # Configure the action of each CLI option
+    for (opt, arg) in opts:
+        if opt == "--date":
+            now = arg
+
+        if opt in ("-d", "--dataDir"):  # Set high-level data directory location
+            dataDir = arg
+
+
+def load_profiles(profile_dir, cancer_types=None):
+    """
+    :arg profile_dir: The profiles/<now> directory to read
+    :arg cancer_types: Which cancers to read, all of them if None
+
+    :type profile_dir: str
+    :type cancer_types: list
+
+    Reads every individual isoform profile into flat arrays with one entry
+    per profile row, tagged by integer codes for cancer and isoform
+    :return: dict of arrays (cancer, isoform, position, score, muts) and the
+    names the codes index (cancers, isoforms, isoform_gene, genes)
+    """
+    cancers = sorted(d for d in listdir(profile_dir)
+                     if d not in (isoformsSubDirName, summarySubDirName) and
+                     path.isdir(path.join(profile_dir, d)) and
+                     (cancer_types is None or d in cancer_types))
+
+    isoform_codes = {}  # {GENE.XXX.long: code}
+    gene_codes = {}  # {GENE.long: code}
+    isoform_gene = []  # gene code for each isoform code
+
+    chunks = []  # (cancer code, isoform code, rows) per profile
+    for (cancer_code, cancer) in enumerate(cancers):
+        for (dirpath, dirnames, filenames) in walk(path.join(profile_dir,
+                                                             cancer)):
+            for (fname, isoform_match) in isoform_profiles(filenames):
+                isoform = ".".join(isoform_match.group(1, 2, 3))
+                if isoform not in isoform_codes:
+                    gene = ".".join(isoform_match.group(1, 3))
+                    isoform_codes[isoform] = len(isoform_codes)
+                    isoform_gene.append(gene_codes.setdefault(gene,
+                                                              len(gene_codes)))
+
+                # Columns are position, disorder score, mutations
+                rows = numpy.column_stack(load_columns(path.join(dirpath,
+                                                                 fname)))
+                chunks.append((cancer_code, isoform_codes[isoform], rows))
+
+    lengths = numpy.array([len(rows) for (_, _, rows) in chunks], dtype=int)
+    if chunks:
+        rows = numpy.concatenate([rows for (_, _, rows) in chunks])
+    else:
+        rows = numpy.zeros((0, 3))
+
+    # Invert the code dicts so names are indexed by code
+    isoforms = sorted(isoform_codes, key=isoform_codes.get)
+    genes = sorted(gene_codes, key=gene_codes.get)
+
+    return {"cancer": numpy.repeat([c for (c, _, _) in chunks],
+                                   lengths).astype(int),
+            "isoform": numpy.repeat([i for (_, i, _) in chunks],
+                                    lengths).astype(int),
+            "position": rows[:, 0].astype(int),
+            "score": rows[:, 1],
+            "muts": rows[:, 2].astype(int),
+            "cancers": cancers,
+            "isoforms": isoforms,
+            "isoform_gene": numpy.array(isoform_gene, dtype=int),
+            "genes": genes}
+
+
+def group_sums(keys, size, profiles):
+    """
+    :arg keys: Group code of each profile row
+    :arg size: Number of possible group codes
+    :arg profiles: Arrays from load_profiles()
+
+    :type keys: numpy.ndarray
+    :type size: int
+    :type profiles: dict
+
+    :return: dict of per-group totals, each an array of length size
+    """
+    score = profiles["score"]
+    muts = profiles["muts"]
+    disordered = score > disorderCutoff
+
+    return {"positions": numpy.bincount(keys, minlength=size),
+            "disordered": numpy.bincount(keys, weights=disordered,
+                                         minlength=size),
+            "mutations": numpy.bincount(keys, weights=muts, minlength=size),
+            "mutated": numpy.bincount(keys, weights=muts > 0, minlength=size),
+            "disordered_mutations": numpy.bincount(keys,
+                                                   weights=muts * disordered,
+                                                   minlength=size),
+            "score": numpy.bincount(keys, weights=score, minlength=size),
+            "mutation_score": numpy.bincount(keys, weights=score * muts,
+                                             minlength=size)}
+
+
+def summary_columns(sums):
+    """
+    :arg sums: Group totals from group_sums()
+    :type sums: dict
+
+    Mutation burden against disorder for each group, matching the totals R
+    samples from: mutation_score is the observed level of generate_log.R
+    :return: list of columns, in the order of summaryHeader
+    """
+    positions = numpy.maximum(sums["positions"], 1)
+    mutations = numpy.maximum(sums["mutations"], 1)
+
+    return [sums["positions"].astype(int),
+            sums["mutations"].astype(int),
+            sums["mutated"].astype(int),
+            sums["mutations"] / positions,
+            sums["score"] / positions,
+            sums["mutation_score"],
+            numpy.where(sums["mutations"] > 0,
+                        sums["mutation_score"] / mutations, numpy.nan),
+            sums["disordered"] / positions,
+            numpy.where(sums["mutations"] > 0,
+                        sums["disordered_mutations"] / mutations, numpy.nan)]
+
+
+def write_table(filename, header, columns, keep):
+    """
+    :arg filename: Where the tab separated table is written
+    :arg header: Column names
+    :arg columns: Arrays or lists, one per column
+    :arg keep: Boolean array of the rows to write
+
+    :return: None, writes filename
+    """
+    formatted = []
+    for column in columns:
+        column = numpy.asarray(column)[keep]
+        if column.dtype.kind == 'f':
+            formatted.append(["%.4f" % value for value in column])
+        else:
+            formatted.append(column.tolist())
+
+    with open(filename, 'w') as FILE:
+        table = writer(FILE, delimiter='\t')
+        table.writerow(header)
+        table.writerows(zip(*formatted))
+
+
+def aggregate_profiles(profile_dir):
+    """
+    :arg profile_dir: The profiles/<now> directory to read
+    :type profile_dir: str
+
+    Computes the isoform, gene, cancer, and cross-cancer position tables in a
+    handful of bincount reductions rather than concatenating profile files
+    :return: None, writes the tables into profile_dir/summary/
+    """
+    print("Aggregating profiles within: " + profile_dir)
+
+    profiles = load_profiles(profile_dir)
+    cancers = numpy.array(profiles["cancers"], dtype=object)
+    isoforms = numpy.array(profiles["isoforms"], dtype=object)
+    genes = numpy.array(profiles["genes"], dtype=object)
+    isoform_gene = profiles["isoform_gene"]
+    n_cancers, n_isoforms, n_genes = len(cancers), len(isoforms), len(genes)
+
+    summary_dir = path.join(profile_dir, summarySubDirName)
+    if not path.exists(summary_dir):
+        makedirs(summary_dir)
+
+    # Cancer x isoform, keyed as cancer * n_isoforms + isoform
+    keys = profiles["cancer"] * n_isoforms + profiles["isoform"]
+    sums = group_sums(keys, n_cancers * n_isoforms, profiles)
+    cancer_of, isoform_of = numpy.divmod(numpy.arange(n_cancers * n_isoforms),
+                                         n_isoforms)
+    write_table(path.join(summary_dir, "isoform_summary.tsv"),
+                ["Type", "Gene", "Isoform"] + summaryHeader,
+                [cancers[cancer_of], genes[isoform_gene[isoform_of]],
+                 isoforms[isoform_of]] + summary_columns(sums),
+                sums["positions"] > 0)
+
+    # Cancer x GENE.long|short
+    keys = profiles["cancer"] * n_genes + isoform_gene[profiles["isoform"]]
+    sums = group_sums(keys, n_cancers * n_genes, profiles)
+    cancer_of, gene_of = numpy.divmod(numpy.arange(n_cancers * n_genes),
+                                      n_genes)
+    write_table(path.join(summary_dir, "gene_summary.tsv"),
+                ["Type", "Gene"] + summaryHeader,
+                [cancers[cancer_of], genes[gene_of]] + summary_columns(sums),
+                sums["positions"] > 0)
+
+    # Cancer x long|short
+    is_short = numpy.array([gene.endswith(".short") for gene in genes],
+                           dtype=int)
+    keys = profiles["cancer"] * 2 + is_short[isoform_gene[profiles["isoform"]]]
+    sums = group_sums(keys, n_cancers * 2, profiles)
+    cancer_of, short_of = numpy.divmod(numpy.arange(n_cancers * 2), 2)
+    write_table(path.join(summary_dir, "cancer_summary.tsv"),
+                ["Type", "Long/Short"] + summaryHeader,
+                [cancers[cancer_of],
+                 numpy.array(["long", "short"], dtype=object)[short_of]] +
+                summary_columns(sums),
+                sums["positions"] > 0)
+
+    # Isoform x position summed across cancers, replacing isoforms/<fname>
+    stride = profiles["position"].max() + 1 if len(profiles["position"]) else 1
+    position_keys, first, inverse = numpy.unique(
+        profiles["isoform"] * stride + profiles["position"],
+        return_index=True, return_inverse=True)
+    n_positions = len(position_keys)
+    write_table(path.join(summary_dir, "isoform_positions.tsv"),
+                ["Isoform", "Position", "Disorder", "Mutations",
+                 "MutatedCancers"],
+                [isoforms[profiles["isoform"][first]],
+                 profiles["position"][first],
+                 profiles["score"][first],
+                 numpy.bincount(inverse, weights=profiles["muts"],
+                                minlength=n_positions).astype(int),
+                 numpy.bincount(inverse, weights=profiles["muts"] > 0,
+                                minlength=n_positions).astype(int)],
+                numpy.ones(n_positions, dtype=bool))
+
+
+if __name__ == "__main__":
+    # Run the CLI wrapper to change global variables
+    main()
+
+    aggregate_profiles(path.join(dataDir, profilesName, now))
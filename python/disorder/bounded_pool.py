@@ -0,0 +1,39 @@
+#!/usr/bin/python
+
+# Name: Ryan Hagenson
+# Email: rhagenson@unomaha.edu
+
+from threading import BoundedSemaphore
+
+inFlightTasks = 64  # Default number of tasks handed to a Pool at one time
+
+
+def bounded_imap_unordered(pool, func, iterable, window=inFlightTasks):
+    """
+    :arg pool: The multiprocessing Pool to run func in
+    :arg func: The function run once per item of iterable
+    :arg iterable: Any iterable, usually a generator of data pairs
+    :arg window: The maximum number of items submitted but not yet returned
+
+    :type pool: multiprocessing.Pool
+    :type func: function
+    :type iterable: iterable
+    :type window: int
+
+    A drop-in for Pool.map() that never materializes iterable or the results
+    Pool.imap_unordered() alone reads its iterable as fast as it can, so
+    items are only released to it while fewer than window are in flight
+    :return: generator of func results in order of completion
+    """
+    slots = BoundedSemaphore(window)
+
+    def throttle():
+        # Runs in the Pool's task handler thread, blocking it when full
+        for item in iterable:
+            slots.acquire()
+            yield item
+
+    for result in pool.imap_unordered(func, throttle()):
+        # A finished task frees a slot for the next item
+        slots.release()
+        yield result
@@ -0,0 +1,352 @@
+#!/usr/bin/python
+
+# Name: Ryan Hagenson
+# Email: rhagenson@unomaha.edu
+
+import sqlite3
+import sys
+from csv import reader, writer
+from datetime import datetime
+from getopt import GetoptError, getopt
+from os import path, makedirs, listdir, walk
+
+from aggregate_profiles import summarySubDirName
+from concat_cancer_logs import isoformsSubDirName, adjustedSubDirName
+from profile_codec import isoform_prof_re, isoform_profiles, load_columns
+
+dataDir = ""  # Default False, should be overwritten at CLI
+profilesName = "profiles"  # The name of the final mutation profile csv's dir
+logs_dir = "../../R/outputs/"  # Location of the logs generated by R Monte carlo
+catalogName = "catalog.sqlite"  # Written within profiles/<now>
+now = datetime.now().strftime("%d-%m-%y")  # Default run time
+method = "BH"  # The adjustment correct_p_values.py reported, see its methods
+scope = "cancer"  # and scopes, chosen by the same --method and --scope
+
+# Columns of the isoforms table, one row per cancer, isoform, and long|short
+# profile and log columns are filled in by whichever tree is indexed
+catalogColumns = ["cancer", "gene", "isoform", "length_class",
+                  "profile", "positions", "mutations",
+                  "log_file", "log_offset", "observed", "average", "p_value",
+                  "direction", "p_adjusted", "adjustment", "selected"]
+
+
+class Catalog(object):
+    """
+    An sqlite index over the profiles/<now> and outputs/<now> trees, so a
+    single gene or the significant isoforms of a cancer are one indexed
+    query away rather than a walk through either tree
+    """
+
+    def __init__(self, catalog_file):
+        """
+        :arg catalog_file: Path of the sqlite file, created if needed
+        :type catalog_file: str
+        """
+        if not path.exists(path.dirname(catalog_file) or "."):
+            makedirs(path.dirname(catalog_file))
+
+        self.db = sqlite3.connect(catalog_file)
+        self.db.execute("CREATE TABLE IF NOT EXISTS isoforms ("
+                        "cancer TEXT NOT NULL, "
+                        "gene TEXT NOT NULL, "
+                        "isoform TEXT NOT NULL, "
+                        "length_class TEXT NOT NULL, "
+                        "profile TEXT, "
+                        "positions INTEGER, "
+                        "mutations INTEGER, "
+                        "log_file TEXT, "
+                        "log_offset INTEGER, "
+                        "observed REAL, "
+                        "average REAL, "
+                        "p_value REAL, "
+                        "direction TEXT, "
+                        "p_adjusted REAL, "
+                        "adjustment TEXT, "
+                        "selected INTEGER NOT NULL DEFAULT 0, "
+                        "PRIMARY KEY (cancer, isoform, length_class))")
+
+        # Catalogs made before the adjustment column was added
+        existing = [row[1] for row in
+                    self.db.execute("PRAGMA table_info(isoforms)")]
+        if "adjustment" not in existing:
+            self.db.execute("ALTER TABLE isoforms ADD COLUMN adjustment TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS isoforms_p_value "
+                        "ON isoforms (cancer, length_class, p_value)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS isoforms_gene "
+                        "ON isoforms (gene)")
+
+    def update(self, rows, columns):
+        """
+        :arg rows: Iterable of (cancer, isoform, length_class, values...)
+        :arg columns: Names of the columns the values are written to
+
+        :type rows: iterable
+        :type columns: list
+
+        Adds or updates rows in a single transaction
+        """
+        assignments = ", ".join(column + " = ?" for column in columns)
+        with self.db:
+            for row in rows:
+                cancer, isoform, length_class = row[:3]
+                gene = isoform_prof_re.sub("\\1",
+                                           isoform + "." + length_class +
+                                           ".prof")
+                self.db.execute("INSERT OR IGNORE INTO isoforms "
+                                "(cancer, gene, isoform, length_class) "
+                                "VALUES (?, ?, ?, ?)",
+                                (cancer, gene, isoform, length_class))
+                self.db.execute("UPDATE isoforms SET " + assignments +
+                                " WHERE cancer = ? AND isoform = ? "
+                                "AND length_class = ?",
+                                tuple(row[3:]) + (cancer, isoform,
+                                                  length_class))
+
+    def add_profiles(self, cancer, rows):
+        """
+        :arg cancer: The cancer type whose profiles were (re)written
+        :arg rows: Iterable of (cancer, isoform, length_class, profile path,
+        positions, mutations), e.g. as create_csv_profile() returns them
+
+        :type cancer: str
+        :type rows: iterable
+        """
+        with self.db:
+            # The cancer's profiles were rewritten, forget the old ones
+            self.db.execute("UPDATE isoforms SET profile = NULL, "
+                            "positions = NULL WHERE cancer = ?", (cancer,))
+
+        self.update(rows, ["profile", "positions", "mutations"])
+
+    def index_profiles(self, profile_dir, cancer_types=None):
+        """
+        :arg profile_dir: The profiles/<now> directory to index
+        :arg cancer_types: Which cancers to index, all of them if None
+
+        Records the path, length, and mutation count of every individual
+        isoform profile, reading each of them
+        """
+        def profile_rows(cancer):
+            for (dirpath, dirnames, filenames) in walk(
+                    path.join(profile_dir, cancer)):
+                for (fname, isoform_match) in isoform_profiles(filenames):
+                    muts = load_columns(path.join(dirpath, fname))[2]
+
+                    yield (cancer,
+                           ".".join(isoform_match.group(1, 2)),
+                           isoform_match.group(3),
+                           path.join(dirpath, fname),
+                           len(muts), int(muts.sum()))
+
+        for cancer in sorted(listdir(profile_dir)):
+            if (cancer in (isoformsSubDirName, summarySubDirName) or
+                    not path.isdir(path.join(profile_dir, cancer)) or
+                    (cancer_types is not None and cancer not in cancer_types)):
+                continue
+
+            print("Indexing profiles for: " + cancer)
+            self.add_profiles(cancer, profile_rows(cancer))
+
+    def add_logs(self, rows):
+        """
+        :arg rows: Iterable of (cancer, isoform, length_class, LOG path,
+        byte offset of the row, observed, average, mutations, p-value,
+        direction)
+        :type rows: iterable
+        """
+        self.update(rows, ["log_file", "log_offset", "observed", "average",
+                           "mutations", "p_value", "direction"])
+
+    def index_logs(self, log_dir, correction=method, which=scope):
+        """
+        :arg log_dir: The outputs/<now> directory to index
+        :arg correction: Which of correct_p_values.methods to record
+        :arg which: Which of correct_p_values.scopes to record
+
+        :type log_dir: str
+        :type correction: str
+        :type which: str
+
+        Records each row of every <CANCER>_LONG_LOG.csv and
+        <CANCER>_SHORT_LOG.csv with its byte offset, and the adjusted
+        p-values of p-adjusted/adjusted_p-values.tsv if it has been written,
+        the isoforms tested there being the selected ones
+        """
+        def log_rows():
+            for cancer in sorted(listdir(log_dir)):
+                if cancer in (isoformsSubDirName, adjustedSubDirName):
+                    continue
+
+                for length_class in ["LONG", "SHORT"]:
+                    log_file = path.join(log_dir, cancer,
+                                         cancer + "_" + length_class +
+                                         "_LOG.csv")
+                    if not path.isfile(log_file):
+                        continue
+
+                    print("Indexing LOG: " + log_file)
+                    offset = 0
+                    with open(log_file, 'r') as FILE:
+                        for line in FILE:
+                            row = next(reader([line]))
+                            isoform, long_short = path.splitext(row[0])
+                            yield (cancer, isoform, long_short[1:],
+                                   log_file, offset, float(row[1]),
+                                   float(row[2]), int(float(row[3])),
+                                   float(row[4]), row[5])
+                            offset += len(line)
+
+        self.add_logs(log_rows())
+
+        adjusted_file = path.join(log_dir, adjustedSubDirName,
+                                  "adjusted_p-values.tsv")
+        if path.isfile(adjusted_file):
+            with self.db:
+                self.db.execute("UPDATE isoforms SET p_adjusted = NULL, "
+                                "adjustment = NULL, selected = 0")
+
+            def adjusted_rows():
+                with open(adjusted_file, 'r') as FILE:
+                    table = reader(FILE, delimiter='\t')
+                    header = next(table)
+                    # The column DisorderPositionResults.tsv was built from
+                    adjustment = correction + "." + which
+                    column = header.index(adjustment)
+                    for row in table:
+                        yield (row[0], path.splitext(row[1])[0], row[2],
+                               float(row[column]), adjustment, 1)
+
+            self.update(adjusted_rows(), ["p_adjusted", "adjustment",
+                                          "selected"])
+
+    def query(self, cancer=None, gene=None, length_class=None, max_p=None,
+              adjusted=False, selected=False):
+        """
+        :arg cancer: Only this cancer type, e.g. KICH
+        :arg gene: Only this gene, e.g. TP53
+        :arg length_class: Only 'long' or 'short'
+        :arg max_p: Only p-values below this
+        :arg adjusted: Compare max_p to the adjusted rather than raw p-value
+        :arg selected: Only the isoform selected to represent each gene
+
+        :return: list of rows, in the order of catalogColumns
+        """
+        clauses, values = [], []
+        for (column, value) in [("cancer", cancer), ("gene", gene),
+                                ("length_class", length_class)]:
+            if value is not None:
+                clauses.append(column + " = ?")
+                values.append(value)
+        if max_p is not None:
+            clauses.append(("p_adjusted" if adjusted else "p_value") + " < ?")
+            values.append(max_p)
+        if selected:
+            clauses.append("selected = 1")
+
+        sql = "SELECT " + ", ".join(catalogColumns) + " FROM isoforms"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY cancer, length_class, isoform"
+
+        return self.db.execute(sql, values).fetchall()
+
+    def write_select(self, select_dir):
+        """
+        :arg select_dir: Where the <CANCER>.<long|short>.select files go
+        :type select_dir: str
+
+        Replaces reextract_select_isoforms.R, one isoform name per line
+        """
+        if not path.exists(select_dir):
+            makedirs(select_dir)
+
+        groups = self.db.execute("SELECT DISTINCT cancer, length_class "
+                                 "FROM isoforms WHERE selected = 1")
+        for (cancer, length_class) in groups.fetchall():
+            with open(path.join(select_dir, cancer + "." + length_class +
+                                ".select"), 'w') as FILE:
+                for (isoform,) in self.db.execute(
+                        "SELECT isoform FROM isoforms WHERE cancer = ? AND "
+                        "length_class = ? AND selected = 1 ORDER BY isoform",
+                        (cancer, length_class)):
+                    FILE.write(isoform + "\n")
+
+
+def main():
+    """
+    A simple wrapper for all CLI options
+
+    Rebuild, e.g. for runs made before the catalog, with the --method and
+    --scope correct_p_values.py ran with:
+        catalog.py -d <dataDir> --date <date> [-l <logsDir>] [-m BH -s cancer] --build
+    Query, e.g. all significant long isoforms for KICH:
+        catalog.py -d <dataDir> --date <date> -c KICH -t long -p 0.05 --adjusted
+    Write the *.select isoform lists:
+        catalog.py -d <dataDir> --date <date> --select <dir>
+    """
+    global dataDir, logs_dir, now, method, scope
+
+    # Enables command-line options via getopt and sys packages
+    try:
+        opts, args = getopt(sys.argv[1:],
+                            'd:l:c:g:t:p:m:s:',
+                            ["dataDir=", "logsDir=", "date=", "cancer=",
+                             "gene=", "lengthClass=", "maxP=", "adjusted",
+                             "selected", "build", "select=", "method=",
+                             "scope="]
+                            )
+    except GetoptError as err:
+        # Redirect STDERR to STDOUT (ensures screen display)
+        sys.stdout = sys.stderr
+        # Print help information
+        print(str(err))
+        # Exit
+        sys.exit(2)
+
+    settings = {}
+
+    # Configure the action of each CLI option
+    for (opt, arg) in opts:
+        if opt in ("-d", "--dataDir"):
+            dataDir = arg
+        elif opt in ("-l", "--logsDir"):
+            logs_dir = arg
+        elif opt == "--date":
+            now = arg
+        elif opt in ("-c", "--cancer"):
+            settings["cancer"] = arg
+        elif opt in ("-g", "--gene"):
+            settings["gene"] = arg
+        elif opt in ("-t", "--lengthClass"):
+            settings["length_class"] = arg
+        elif opt in ("-p", "--maxP"):
+            settings["max_p"] = float(arg)
+        elif opt == "--select":
+            settings["select"] = arg
+        elif opt in ("-m", "--method"):
+            method = arg
+        elif opt in ("-s", "--scope"):
+            scope = arg
+        else:
+            settings[opt.lstrip("-")] = True
+
+    return settings
+
+
+if __name__ == "__main__":
+    # Run the CLI wrapper to change global variables
+    settings = main()
+
+    catalog = Catalog(path.join(dataDir, profilesName, now, catalogName))
+
+    if settings.pop("build", False):
+        catalog.index_profiles(path.join(dataDir, profilesName, now))
+        if path.isdir(path.join(logs_dir, now)):
+            catalog.index_logs(path.join(logs_dir, now), method, scope)
+
+    if "select" in settings:
+        catalog.write_select(settings.pop("select"))
+    elif settings:
+        table = writer(sys.stdout, delimiter='\t')
+        table.writerow(catalogColumns)
+        table.writerows(catalog.query(**settings))
@@ -17,6 +17,7 @@ from os.path import basename
 logs_dir = "../../R/outputs/"  # Location of the logs generated by R Monte carlo
 now = datetime.now().strftime("%d-%m-%y")  # Default run time
 isoformsSubDirName = "isoforms"
+adjustedSubDirName = "p-adjusted"  # Written by correct_p_values.py, not a cancer
 
 
 # General directory tree within dataDir is:
@@ -78,8 +79,9 @@ def concat_cancer_logs(log_dir=logs_dir):
     :return: A single file per cancer type of the complete LOGs
     """
 
-    cancer_types = os.listdir(log_dir)
-    cancer_types.remove(isoformsSubDirName)  # Remove "isoforms" directory
+    # Remove "isoforms" and "p-adjusted" directories
+    cancer_types = [d for d in os.listdir(log_dir)
+                    if d not in (isoformsSubDirName, adjustedSubDirName)]
 
     for type in cancer_types:
         # Final files
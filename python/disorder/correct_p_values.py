@@ -0,0 +1,372 @@
+#!/usr/bin/python
+
+# Name: Ryan Hagenson
+# Email: rhagenson@unomaha.edu
+
+import sys
+from array import array
+from csv import reader, writer
+from datetime import datetime
+from getopt import GetoptError, getopt
+from os import path, makedirs, listdir
+from re import compile
+
+import numpy
+
+from catalog import Catalog, catalogName
+from concat_cancer_logs import concat_cancer_logs, isoformsSubDirName, \
+    adjustedSubDirName
+
+logs_dir = "../../R/outputs/"  # Location of the logs generated by R Monte carlo
+dataDir = ""  # Optional, refSeq FASTA lengths break ties between isoforms
+refSeqName = "refSeq"  # The name of the refSeq dir in dataDir
+profilesName = "profiles"  # Where the catalog of the same date is kept
+now = datetime.now().strftime("%d-%m-%y")  # Default run time
+
+pValCutoff = 0.05  # Adjusted p-values below this are reported
+method = "BH"  # One of methods, used for DisorderPositionResults.tsv
+scope = "cancer"  # One of scopes, used for DisorderPositionResults.tsv
+selectIsoforms = True  # Test one representative isoform per gene, as in R
+storeyLambda = 0.5  # p-values above this estimate the true null proportion
+
+methods = ["BH", "bonferroni", "qvalue"]
+scopes = ["cancer", "class", "global"]  # cancer and long|short, long|short, all
+lengthClasses = ["LONG", "SHORT"]
+
+# Captures three groups from a LOG isoform name, e.g. TP53.003.long:
+# .group(1): gene name
+# .group(2): isoform number
+# .group(3): long or short
+isoform_re = compile('^(.+)\.(\d+)\.(long|short)$')
+
+# General directory tree within logs_dir/<now> is:
+# ./<CANCER>/<CANCER>_LONG_LOG.csv  # From concat_cancer_logs()
+# ./<CANCER>/<CANCER>_SHORT_LOG.csv
+# ./p-adjusted  # Should be made by script
+# ./p-adjusted/adjusted_p-values.tsv  # Every test with every adjustment
+# ./p-adjusted/DisorderPositionResults.tsv  # Significant tests only
+
+
+def main():
+    """
+    A simple wrapper for all CLI options
+    """
+    global logs_dir, dataDir, now, pValCutoff, method, scope, selectIsoforms
+
+    # Enables command-line options via getopt and sys packages
+    try:
+        opts, args = getopt(sys.argv[1:],
+                            'l:d:c:m:s:a',
+                            ["logsDir=", "date=", "dataDir=", "cutoff=",
+                             "method=", "scope=", "allIsoforms"]
+                            )
+    except GetoptError as err:
+        # Redirect STDERR to STDOUT (ensures screen display)
+        sys.stdout = sys.stderr
+        # Print help information
+        print(str(err))
+        # Exit
+        sys.exit(2)
+
+    # Configure the action of each CLI option
+    for (opt, arg) in opts:
+        if opt in ("-l", "--logsDir"):  # Where the dated outputs/ are found
+            logs_dir = arg
+        elif opt in ("-d", "--date"):
+            now = arg
+        elif opt == "--dataDir":
+            dataDir = arg
+        elif opt in ("-c", "--cutoff"):
+            pValCutoff = float(arg)
+        elif opt in ("-m", "--method"):
+            method = arg
+        elif opt in ("-s", "--scope"):
+            scope = arg
+        elif opt in ("-a", "--allIsoforms"):
+            selectIsoforms = False
+
+    if method not in methods or scope not in scopes:
+        print("--method must be one of: [" + ", ".join(methods) + "] and " +
+              "--scope one of: [" + ", ".join(scopes) + "]")
+        sys.exit(2)
+
+
+def read_logs(log_dir):
+    """
+    :arg log_dir: The outputs/<now> directory holding one directory per cancer
+    :type log_dir: str
+
+    Streams every <CANCER>_LONG_LOG.csv and <CANCER>_SHORT_LOG.csv row into
+    flat arrays, the LOG columns being isoform name, observed disorder,
+    average random disorder, number of mutations, p-value, and direction
+    :return: dict of arrays (cancer, lengthClass, mutations, pValue,
+    direction), isoform names, and the cancer names the codes index
+    """
+    cancers = sorted(d for d in listdir(log_dir)
+                     if d not in (isoformsSubDirName, adjustedSubDirName) and
+                     path.isdir(path.join(log_dir, d)))
+
+    cancer = array('i')
+    length_class = array('b')
+    mutations = array('d')
+    p_value = array('d')
+    direction = array('b')
+    isoforms = []
+
+    for (cancer_code, ctype) in enumerate(cancers):
+        for (class_code, lclass) in enumerate(lengthClasses):
+            log_file = path.join(log_dir, ctype,
+                                 ctype + "_" + lclass + "_LOG.csv")
+            try:
+                CSV = reader(open(log_file, "r"), delimiter=",")
+            except IOError as e:
+                print(str(e))  # send the error out for bug tracking
+                continue  # Move to the next file
+
+            for row in CSV:
+                cancer.append(cancer_code)
+                length_class.append(class_code)
+                isoforms.append(row[0])
+                mutations.append(float(row[3]))
+                p_value.append(float(row[4]))
+                direction.append(row[5] == "+")
+
+    return {"cancer": numpy.frombuffer(cancer, dtype=numpy.int32),
+            "lengthClass": numpy.frombuffer(length_class, dtype=numpy.int8),
+            "mutations": numpy.frombuffer(mutations, dtype=numpy.float64),
+            "pValue": numpy.frombuffer(p_value, dtype=numpy.float64),
+            "direction": numpy.frombuffer(direction, dtype=numpy.int8),
+            "isoforms": isoforms,
+            "cancers": cancers}
+
+
+def isoform_length(isoform):
+    """
+    :arg isoform: Isoform name without .long or .short, e.g. A1CF.004
+    :type isoform: str
+
+    Mirrors R-defs/isoform_length.R
+    :return: length of the refSeq FASTA sequence, 0 if it cannot be read
+    """
+    try:
+        with open(path.join(dataDir, refSeqName, isoform + ".fasta")) as FILE:
+            return sum(len(line.strip()) for line in FILE
+                       if not line.startswith(">"))
+    except IOError:
+        return 0
+
+
+def isoform_lengths(isoforms, rows, known):
+    """
+    :arg isoforms: LOG isoform names, e.g. A1CF.004.long
+    :arg rows: Index of the isoforms wanted
+    :arg known: Lengths already read, updated in place
+
+    :type isoforms: list
+    :type rows: numpy.ndarray
+    :type known: dict
+
+    :return: isoform_length() of each of rows, reading each FASTA once
+    """
+    bare_names = [isoform_re.sub("\\1.\\2", isoforms[row]) for row in rows]
+    for name in bare_names:
+        if name not in known:
+            known[name] = isoform_length(name)
+    return numpy.array([known[name] for name in bare_names], dtype=float)
+
+
+def select_isoforms(logs):
+    """
+    :arg logs: Arrays from read_logs()
+    :type logs: dict
+
+    Picks one isoform per gene within each cancer and long|short, as
+    R-defs/correction.R does, since isoforms of one gene are not independent
+    Best is by decreasing mutations, increasing length, then name
+    With dataDir, a selected isoform without a refSeq FASTA (length 0) is
+    dropped, as correction.R drops isoLength == 0
+    :return: integer index of the selected rows
+    """
+    if len(logs["isoforms"]) == 0:
+        return numpy.arange(0)
+
+    names = numpy.array(logs["isoforms"], dtype=object)
+    gene_names = [isoform_re.sub("\\1", name) for name in logs["isoforms"]]
+    genes = numpy.unique(gene_names, return_inverse=True)[1]
+    name_rank = numpy.unique(names, return_inverse=True)[1]
+
+    # Lengths only matter between isoforms tied on mutations and for the
+    # selected ones, so only those FASTA files are read, each once however
+    # many cancers test it
+    known = {}  # {isoform: length}
+
+    lengths = numpy.zeros(len(names))
+    if dataDir:
+        keys = numpy.column_stack((logs["cancer"], logs["lengthClass"], genes,
+                                   logs["mutations"]))
+        inverse, counts = numpy.unique(keys, axis=0, return_inverse=True,
+                                       return_counts=True)[1:]
+        tied = numpy.flatnonzero(counts[inverse] > 1)
+        lengths[tied] = isoform_lengths(logs["isoforms"], tied, known)
+
+    # The last key is the primary sort key
+    order = numpy.lexsort((name_rank, lengths, -logs["mutations"], genes,
+                           logs["lengthClass"], logs["cancer"]))
+    group = (logs["cancer"][order].astype(numpy.int64) * 2 +
+             logs["lengthClass"][order]) * (genes.max() + 1) + genes[order]
+
+    # The first row of each group is its best isoform
+    first = numpy.r_[True, group[1:] != group[:-1]]
+    selected = order[first]
+
+    if dataDir:
+        selected = selected[isoform_lengths(logs["isoforms"], selected,
+                                            known) != 0]
+
+    return selected
+
+
+def adjust(p_values, groups, correction, order=None):
+    """
+    :arg p_values: float64 p-values
+    :arg groups: Integer group of each p-value, adjusted separately
+    :arg correction: One of methods
+    :arg order: numpy.argsort(p_values), if already computed
+
+    :type p_values: numpy.ndarray
+    :type groups: numpy.ndarray
+    :type correction: str
+    :type order: numpy.ndarray
+
+    Sorts once by group then p-value, each group is then a contiguous,
+    already ordered slice, so the rest are vectorized passes
+    :return: adjusted p-values, in the order given
+    """
+    result = numpy.empty(len(p_values))
+
+    if order is None:
+        order = numpy.argsort(p_values)
+    # A stable sort by group keeps increasing p-value within each group
+    order = order[numpy.argsort(groups[order], kind="mergesort")]
+    bounds = numpy.flatnonzero(numpy.diff(groups[order])) + 1
+
+    for members in numpy.split(order, bounds):  # Increasing p-value
+        if len(members) == 0:
+            continue  # No p-values at all
+        p_sorted = p_values[members]
+        n = float(len(p_sorted))
+
+        if correction == "bonferroni":
+            adjusted = p_sorted * n
+        else:
+            # Benjamini-Hochberg, p * n / rank then a running minimum from
+            # the largest p-value down
+            adjusted = p_sorted * n / numpy.arange(1, len(p_sorted) + 1)
+            adjusted = numpy.minimum.accumulate(adjusted[::-1])[::-1]
+
+            if correction == "qvalue":
+                # Storey q-values scale BH by the estimated null proportion
+                # LOG p-values are the smaller tail, so pi0 is estimated on
+                # the two-sided 2p, which is uniform under the null, with
+                # the +1 of Storey, Taylor & Siegmund (2004) keeping pi0 > 0
+                two_sided = numpy.minimum(2 * p_sorted, 1)
+                pi0 = (numpy.count_nonzero(two_sided > storeyLambda) + 1) / \
+                    (n * (1 - storeyLambda))
+                adjusted = adjusted * min(pi0, 1)
+
+        result[members] = numpy.minimum(adjusted, 1)
+
+    return result
+
+
+def scope_groups(logs, rows, which):
+    """
+    :return: the group of each of rows when adjusting over the scope which
+    """
+    if which == "cancer":
+        return logs["cancer"][rows].astype(numpy.int64) * 2 + \
+            logs["lengthClass"][rows]
+    if which == "class":
+        return logs["lengthClass"][rows].astype(numpy.int64)
+    return numpy.zeros(len(rows), dtype=numpy.int64)
+
+
+def correct_p_values(log_dir):
+    """
+    :arg log_dir: The outputs/<now> directory holding one directory per cancer
+    :type log_dir: str
+
+    :return: None, writes adjusted_p-values.tsv and DisorderPositionResults.tsv
+    into log_dir/p-adjusted/
+    """
+    # Build any <CANCER>_LONG_LOG.csv/<CANCER>_SHORT_LOG.csv still missing
+    concat_cancer_logs(log_dir)
+
+    print("Correcting p-values within: " + log_dir)
+    logs = read_logs(log_dir)
+
+    if selectIsoforms:
+        rows = select_isoforms(logs)
+    else:
+        rows = numpy.arange(len(logs["isoforms"]))
+    p_values = logs["pValue"][rows]
+    order = numpy.argsort(p_values)  # Shared by every adjustment
+
+    columns = {}
+    for which in scopes:
+        groups = scope_groups(logs, rows, which)
+        for correction in methods:
+            columns[(which, correction)] = adjust(p_values, groups,
+                                                  correction, order)
+
+    out_dir = path.join(log_dir, adjustedSubDirName)
+    if not path.exists(out_dir):
+        makedirs(out_dir)
+
+    cancers = numpy.array(logs["cancers"], dtype=object)[logs["cancer"][rows]]
+    classes = numpy.array(["long", "short"],
+                          dtype=object)[logs["lengthClass"][rows]]
+    isoforms = [logs["isoforms"][row] for row in rows]
+
+    # Every test with every adjustment
+    keys = [(which, correction) for which in scopes for correction in methods]
+    with open(path.join(out_dir, "adjusted_p-values.tsv"), "w") as FILE:
+        table = writer(FILE, delimiter="\t")
+        table.writerow(["Type", "Isoform", "Long/Short", "Mutations",
+                        "Direction (1=+)", "P-val"] +
+                       [correction + "." + which
+                        for (which, correction) in keys])
+        table.writerows(zip(cancers, isoforms, classes,
+                            logs["mutations"][rows].astype(int).tolist(),
+                            logs["direction"][rows].tolist(),
+                            p_values.tolist(),
+                            *[columns[key].tolist() for key in keys]))
+
+    # Only the significant tests, in the form of the R processing/ table
+    adjusted = columns[(scope, method)]
+    significant = numpy.flatnonzero(adjusted < pValCutoff)
+    with open(path.join(out_dir, "DisorderPositionResults.tsv"), "w") as FILE:
+        table = writer(FILE, delimiter="\t")
+        table.writerow(["Type", "Gene", "Isoform", "Direction (1=+)",
+                        "Long/Short", "P-val"])
+        for index in significant:
+            gene, number, lclass = isoform_re.search(isoforms[index]).groups()
+            table.writerow([cancers[index], gene, int(number),
+                            logs["direction"][rows[index]], lclass,
+                            "%g" % adjusted[index]])
+
+    print("The number of significant values is: " + str(len(significant)))
+
+
+if __name__ == "__main__":
+    # Run the CLI wrapper to change global variables
+    main()
+
+    # Run the program
+    correct_p_values(path.join(logs_dir, now))
+
+    # Add the p-values to the catalog next to the profiles of the same date
+    if dataDir:
+        Catalog(path.join(dataDir, profilesName, now,
+                          catalogName)).index_logs(path.join(logs_dir, now),
+                                                   method, scope)
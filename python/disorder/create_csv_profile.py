@@ -4,18 +4,29 @@
 # Email: rhagenson@unomaha.edu
 
 from operator import itemgetter
+import ctypes
 import sys
+from array import array
 from csv import reader, writer
 from datetime import datetime
 from distutils.dir_util import mkpath
 from getopt import GetoptError, getopt
 from multiprocessing import Pool, cpu_count
+from multiprocessing.sharedctypes import RawArray
 from os import path, makedirs, listdir, walk
 from os.path import basename
 from re import search, compile
 
 from shutil import rmtree
 
+import numpy
+
+from aggregate_profiles import aggregate_profiles
+from bounded_pool import bounded_imap_unordered
+from catalog import Catalog, catalogName
+from profile_codec import encode_profile, profile_lines, binaryExtension, \
+    isoform_profiles
+
 dataDir = ""  # Default False, should be overwritten at CLI
 allMAFsName = "allMAFs"  # The name of the allMAFs dir in dataDir
 allMutsName = "allMuts"  # The name of the allMuts dir in dataDir
@@ -27,6 +38,21 @@ isoformsSubDirName = "isoforms"
 
 cancerTypes = ['BRCA']
 now = datetime.now().strftime("%d-%m-%y")  # Default run time
+streamPairs = False  # Skip the shared arrays, streaming pairs from allMuts
+aggregateProfiles = False  # Summary tables in place of concatenated files
+binaryProfiles = False  # Write .bprof, see profile_codec.py, rather than .prof
+
+# Captures three groups from each line of an iupredLong|iupredShort file:
+# .group(1): position number
+# .group(2): amino acid 1-letter code
+# .group(3): disorder score
+long_short_re = compile('\s+(\d+)\s+(\w+)\s+(.+)')
+
+# Flat arrays published by load_shared_data() for create_shared_profile()
+# Kept in shared memory so every worker (and every replacement worker from
+# maxtasksperchild) reads the same copy rather than re-parsing files
+sharedArrays = {}
+sharedNames = []  # (mut_file, long_short_file) for each task index
 
 # General directory tree within dataDir is:
 # ./allMuts
@@ -47,13 +73,15 @@ def main():
     """
     A simple wrapper for all CLI options
     """
-    global dataDir, now, cancerTypes
+    global dataDir, now, cancerTypes, streamPairs, aggregateProfiles, \
+        binaryProfiles
 
     # Enables command-line options via getopt and sys packages
     try:
         opts, args = getopt(sys.argv[1:],
-                            'd:c:',
-                            ["date=", "dataDir=", "cancerTypes="]
+                            'd:c:sab',
+                            ["date=", "dataDir=", "cancerTypes=", "stream",
+                             "aggregate", "binary"]
                             )
     except GetoptError as err:
         # Redirect STDERR to STDOUT (ensures screen display)
@@ -84,20 +112,28 @@ def main():
         if opt in ("-c",  "--cancerTypes"):
             cancerTypes = arg.split(',')
 
+        # Memory independent of the mutation set, at the cost of re-parsing
+        if opt in ("-s", "--stream"):
+            streamPairs = True
+
+        # Vectorized summaries rather than appending every profile file
+        if opt in ("-a", "--aggregate"):
+            aggregateProfiles = True
+
+        # Compact profiles, see profile_codec.py
+        # R reads text only, run profile_codec.py --text before the R stages
+        if opt in ("-b", "--binary"):
+            binaryProfiles = True
+
 
 def create_csv_profile((mut_file, long_short_file)):
     """
-    Run by Pool.map() with data from generate_data_pairs()
-    :return:
+    Run by bounded_imap_unordered() with data from generate_data_pairs()
+    Writes <long_short_file>.prof, or .bprof with -b
+    :return: catalog_row() of the profile written, None if an input is missing
     """
     global dataDir, allMutsName, refSeqName, profilesName, isoformsSubDirName
 
-    # Captures three groups:
-    # .group(1): position number
-    # .group(2): amino acid 1-letter code
-    # .group(3): disorder score
-    long_short_re = compile('\s+(\d+)\s+(\w+)\s+(.+)')
-
     # Build and open the allMuts file
     try:
         mut_file_handle = open(path.join(dataDir,
@@ -132,39 +168,6 @@ def create_csv_profile((mut_file, long_short_file)):
         # therefore the datapair is invalid
         return
 
-    # Generate profiles directory tree with each cancer type and gene id
-    cancer_type = search("(\w+)\_.+\.txt", mut_file).group(1)
-    geneMatch = search("([\w|-]+)+\.\d+\.([long|short]+)",
-                       long_short_file)
-    # GENE.long or GENE.short, separates long and short at the gene level
-    gene_name = ".".join(map(str, geneMatch.group(1, 2)))
-
-    # Create by cancer-type and cancer-independent paths
-    full_path = path.join(dataDir,
-                          profilesName,
-                          now,
-                          cancer_type,
-                          gene_name)
-
-    isoform_path = path.join(dataDir,
-                             profilesName,
-                             now,
-                             isoformsSubDirName)
-
-    # If full_path does not exist, isoform_path should not
-    if not path.exists(full_path):
-        mkpath(full_path)
-        mkpath(isoform_path)
-
-    # profile_file is a profile for each isoform, dependent on cancer type
-    profile_file = open(path.join(dataDir,
-                                  profilesName,
-                                  now,
-                                  cancer_type,
-                                  gene_name,
-                                  long_short_file + ".prof"), 'w')
-    profile_csv = writer(profile_file, delimiter='\t')
-
     # Extract the mutations from the allMuts file
     isoform_name, long_short = path.splitext(long_short_file)
 
@@ -188,12 +191,13 @@ def create_csv_profile((mut_file, long_short_file)):
         # Found a mutation in the protein
         if row[0] == isoform_name:
             # If the pos has a mutation, iterate or initialize it
-            if row[6] in mutations:
+            if row[5] in mutations:
                 mutations[row[5]] += 1
             else:
                 mutations[row[5]] = 1
 
     # Gather the rest of the information from long_short file
+    rows = []
     for line in long_short_file_handle:
         # Skip comment lines at start
         if line.startswith('#'):
@@ -205,26 +209,264 @@ def create_csv_profile((mut_file, long_short_file)):
             if long_short_match.group(1) in mutations:
                 pos_muts = mutations[long_short_match.group(1)]
 
-            # Output the individual isoform results to the pertinent file: profile_csv
-            # Combining these files into gene, isoform, and cancer-level is done later
-            profile_csv.writerow([long_short_match.group(1),
-                                  long_short_match.group(2),
-                                  long_short_match.group(3),
-                                  pos_muts])
+            rows.append([long_short_match.group(1),
+                         long_short_match.group(2),
+                         long_short_match.group(3),
+                         pos_muts])
+
+    # Output the individual isoform results to the pertinent file
+    # Combining these files into gene, isoform, and cancer-level is done later
+    # profile_file is a profile for each isoform, dependent on cancer type
+    if binaryProfiles:
+        profile_file = open_profile_file(mut_file, long_short_file,
+                                         binaryExtension)
+        columns = zip(*rows) or [[], [], [], []]
+        profile_file.write(encode_profile(
+            numpy.array(columns[0], dtype=int),
+            "".join(residue[0] for residue in columns[1]),
+            numpy.array(columns[2], dtype=float),
+            numpy.array(columns[3], dtype=int)))
+    else:
+        profile_file = open_profile_file(mut_file, long_short_file)
+        writer(profile_file, delimiter='\t').writerows(rows)
+
+    # Be sure to release the file to free resources
+    profile_file.close()
+
+    return catalog_row(mut_file, long_short_file, profile_file.name,
+                       len(rows), sum(row[3] for row in rows))
+
+
+def catalog_row(mut_file, long_short_file, profile_file, positions,
+                mutations):
+    """
+    :arg mut_file: The allMuts filename the profile is built from
+    :arg long_short_file: The iupredLong|iupredShort filename of the isoform
+    :arg profile_file: Path of the profile written
+    :arg positions: Number of rows in the profile
+    :arg mutations: Number of mutations in the profile
+
+    :return: the row Catalog.add_profiles() records for the profile
+    """
+    isoform_name, long_short = path.splitext(long_short_file)
+    return (search("(\w+)\_.+\.txt", mut_file).group(1), isoform_name,
+            long_short[1:], profile_file, positions, mutations)
+
+
+def profile_path(mut_file, long_short_file, extension=".prof"):
+    """
+    :arg mut_file: The allMuts filename the profile is built from
+    :arg long_short_file: The iupredLong|iupredShort filename of the isoform
+    :arg extension: .prof, or .bprof for a binary profile
+
+    :type mut_file: str
+    :type long_short_file: str
+    :type extension: str
+
+    :return: path of the profile written for the data pair, e.g.
+    profiles/<now>/<CANCER>/<GENE.long|short>/<long_short_file><extension>
+    """
+    # Generate profiles directory tree with each cancer type and gene id
+    cancer_type = search("(\w+)\_.+\.txt", mut_file).group(1)
+    geneMatch = search("([\w|-]+)+\.\d+\.([long|short]+)",
+                       long_short_file)
+    # GENE.long or GENE.short, separates long and short at the gene level
+    gene_name = ".".join(map(str, geneMatch.group(1, 2)))
+
+    return path.join(dataDir,
+                     profilesName,
+                     now,
+                     cancer_type,
+                     gene_name,
+                     long_short_file + extension)
+
+
+def open_profile_file(mut_file, long_short_file, extension=".prof"):
+    """
+    See profile_path() for the arguments
+
+    Builds the profiles/<now>/<CANCER>/<GENE.long|short>/ tree as needed
+    :return: file handle open for writing at profile_path()
+    """
+    global dataDir, profilesName, isoformsSubDirName
+
+    profile_file = profile_path(mut_file, long_short_file, extension)
+    full_path = path.dirname(profile_file)
+
+    isoform_path = path.join(dataDir,
+                             profilesName,
+                             now,
+                             isoformsSubDirName)
+
+    # If full_path does not exist, isoform_path should not
+    if not path.exists(full_path):
+        mkpath(full_path)
+        mkpath(isoform_path)
+
+    return open(profile_file, 'wb')
+
+
+def load_shared_data(ctype):
+    """
+    :arg ctype: Which cancer is currently being processed
+    :type ctype: str
+
+    Run once in the parent before the Pool is created
+    Parses every allMuts file for ctype and every iupredLong|iupredShort file
+    named by generate_data_pairs() a single time, publishing the results as
+    flat shared arrays in sharedArrays:
+        positions, residues, scores -- one segment per iupred file
+        mut_positions, mut_counts -- one segment per data pair
+        tasks -- (seq_start, seq_stop, mut_start, mut_stop) per data pair
+    :return: task indices for create_shared_profile()
+    """
+    global dataDir, allMutsName, refSeqName, sharedArrays, sharedNames
+
+    print("Loading shared data for: " + ctype)
+
+    positions = array('i')
+    residues = array('B')
+    scores = array('d')
+    mut_positions = array('i')
+    mut_counts = array('i')
+    tasks = array('l')
+    names = []
+
+    mutations = {}  # {mut_file: {isoform: {pos#: count}}}
+    segments = {}  # {long_short_file: (seq_start, seq_stop)}
+
+    for (mut_file, long_short_file) in generate_data_pairs(ctype):
+        # Parse each allMuts file only once, keyed by isoform then position
+        if mut_file not in mutations:
+            mutations[mut_file] = {}
+            with open(path.join(dataDir, allMutsName, mut_file), 'r') as FILE:
+                for row in reader(FILE, delimiter='\t'):
+                    try:
+                        pos = int(row[5])
+                    except (IndexError, ValueError):
+                        continue  # Mutation without a protein position
+                    isoform_muts = mutations[mut_file].setdefault(row[0], {})
+                    isoform_muts[pos] = isoform_muts.get(pos, 0) + 1
+
+        # Parse each iupred file only once, no matter how many pairs use it
+        if long_short_file not in segments:
+            if '.long' in long_short_file:
+                iupred_dir = "iupredLong"
+            else:
+                iupred_dir = "iupredShort"
+
+            seq_start = len(positions)
+            try:
+                with open(path.join(dataDir, refSeqName, iupred_dir,
+                                    long_short_file), 'r') as FILE:
+                    for line in FILE:
+                        # Skip comment lines at start
+                        if line.startswith('#'):
+                            continue
+
+                        long_short_match = search(long_short_re, line)
+                        if long_short_match:
+                            positions.append(int(long_short_match.group(1)))
+                            residues.append(ord(long_short_match.group(2)[0]))
+                            scores.append(float(long_short_match.group(3)))
+            except IOError as e:
+                print(str(e))  # send the error out for bug tracking
+                continue
+
+            segments[long_short_file] = (seq_start, len(positions))
+
+        # Store this pair's mutations sparsely as (position, count)
+        isoform_name = path.splitext(long_short_file)[0]
+        isoform_muts = mutations[mut_file].get(isoform_name, {})
+        mut_start = len(mut_positions)
+        for pos in sorted(isoform_muts):
+            mut_positions.append(pos)
+            mut_counts.append(isoform_muts[pos])
+
+        tasks.extend(segments[long_short_file] +
+                     (mut_start, len(mut_positions)))
+        names.append((mut_file, long_short_file))
+
+    # Copy into shared memory, inherited by every worker the Pool forks
+    sharedArrays = {}
+    for (name, values) in [("positions", positions),
+                           ("residues", residues),
+                           ("scores", scores),
+                           ("mut_positions", mut_positions),
+                           ("mut_counts", mut_counts),
+                           ("tasks", tasks)]:
+        # array typecodes are C types, which numpy understands directly
+        dtype = numpy.dtype(values.typecode)
+        raw = RawArray(ctypes.c_char, max(len(values), 1) * dtype.itemsize)
+        shared = numpy.frombuffer(raw, dtype=dtype, count=len(values))
+        if len(values) > 0:
+            shared[:] = numpy.frombuffer(values, dtype=dtype)
+        sharedArrays[name] = shared
+    sharedArrays["tasks"] = sharedArrays["tasks"].reshape(-1, 4)
+    sharedNames = names
+
+    return xrange(len(names))
+
+
+def create_shared_profile(task):
+    """
+    :arg task: Index into the data pairs published by load_shared_data()
+    :type task: int
+
+    Run by bounded_imap_unordered() with indices from load_shared_data()
+    Equivalent to create_csv_profile() but only slices the shared arrays
+    :return: catalog_row() of the profile, writing the same
+    <long_short_file>.prof, or .bprof with -b
+    """
+    global sharedArrays, sharedNames
+
+    mut_file, long_short_file = sharedNames[task]
+    seq_start, seq_stop, mut_start, mut_stop = sharedArrays["tasks"][task]
+
+    positions = sharedArrays["positions"][seq_start:seq_stop]
+    residues = sharedArrays["residues"][seq_start:seq_stop]
+    scores = sharedArrays["scores"][seq_start:seq_stop]
+    mut_positions = sharedArrays["mut_positions"][mut_start:mut_stop]
+
+    print "Processing " + str(long_short_file)  # Inform user what is being done
+
+    # Place each mutation at its position, dropping those outside the isoform
+    pos_muts = numpy.zeros(len(positions), dtype=numpy.int32)
+    index = numpy.searchsorted(positions, mut_positions)
+    found = index < len(positions)
+    found[found] = positions[index[found]] == mut_positions[found]
+    numpy.add.at(pos_muts, index[found],
+                 sharedArrays["mut_counts"][mut_start:mut_stop][found])
+
+    if binaryProfiles:
+        profile_file = open_profile_file(mut_file, long_short_file,
+                                         binaryExtension)
+        profile_file.write(encode_profile(positions, residues, scores,
+                                          pos_muts))
+    else:
+        profile_file = open_profile_file(mut_file, long_short_file)
+        profile_csv = writer(profile_file, delimiter='\t')
+        profile_csv.writerows(zip(positions.tolist(),
+                                  residues.tostring(),
+                                  ["%.4f" % score for score in scores],
+                                  pos_muts.tolist()))
 
     # Be sure to release the file to free resources
     profile_file.close()
 
+    return catalog_row(mut_file, long_short_file, profile_file.name,
+                       len(positions), int(pos_muts.sum()))
+
 
 def generate_data_pairs(ctype):
     """
     :arg ctype: Which cancer is currently being processed
     :type ctype: str
 
-    Builds an iterable list of data pairs for Pool.map()
+    Lazily generates data pairs for bounded_imap_unordered()
     Reads each file in data/allMuts/, for each line it determines if that
     protein has a corresponding file in iupredLong|iupredShort, if it does it
-    adds a new entry in datapairs in style ['<allMuts filename>',
+    yields a new data pair in style ['<allMuts filename>',
     '<iupredLong prop.XXX>.long']
     """
     global dataDir, allMutsName, refSeqName
@@ -234,11 +476,6 @@ def generate_data_pairs(ctype):
 
     print("Generating data pairs")
 
-    # Define the return iterable
-    # Entries should be in form [[allMutsFile, iupredFile]]
-    # Each with full absolute path
-    datapairs = []
-
     # Collect the files in allMuts with absolute pathing
     mut_filepaths = []
     for f in listdir(mut_loc):
@@ -273,14 +510,12 @@ def generate_data_pairs(ctype):
                                        "iupredShort",
                                        protein_isoform + ".short")
 
-                # Create a new datapairs entry for each file found
+                # Yield a new data pair for each file found
+                # Entries should be in form [allMutsFile, iupredFile]
                 if path.exists(long_path):
-                    datapairs.append([mut_name, protein_isoform + ".long"])
+                    yield [mut_name, protein_isoform + ".long"]
                 if path.exists(short_path):
-                    datapairs.append([mut_name, protein_isoform + ".short"])
-
-    # Once all the allMuts files have been fully processed, return the datapairs
-    return datapairs
+                    yield [mut_name, protein_isoform + ".short"]
 
 
 # Need to add functionality that concatenates isoforms from across cancer
@@ -305,24 +540,23 @@ def concatenate_isoforms(cancer_type):
                                 basename(dirpath) + ".prof")),
                   'w') as outfile:
 
-            for fname in filenames:
-                # Check to make sure the file has an isoform number before
-                # reading it
-                if search("\w+\.\d+\.\w+", fname):
-                    with open(path.join(dirpath, fname), 'r') as infile:
-                        isoformProfile = open(path.join(dataDir,
-                                                        profilesName,
-                                                        now,
-                                                        isoformsSubDirName,
-                                                        fname),
-                                              'a')
-                        for line in infile:
-                            outfile.write(line)
-                            cancerProfile.write(line)
-                            isoformProfile.write(line)
-
-                        # Close the isoform profile after appending all lines to it
-                        isoformProfile.close()
+            # Only files with an isoform number, once per isoform
+            for (fname, isoform_match) in isoform_profiles(filenames):
+                # Binary profiles are concatenated as text all the same
+                isoformProfile = open(path.join(dataDir,
+                                                profilesName,
+                                                now,
+                                                isoformsSubDirName,
+                                                path.splitext(fname)[0] +
+                                                ".prof"),
+                                      'a')
+                for line in profile_lines(path.join(dirpath, fname)):
+                    outfile.write(line)
+                    cancerProfile.write(line)
+                    isoformProfile.write(line)
+
+                # Close the isoform profile after appending all lines to it
+                isoformProfile.close()
 
     # Be sure to close the whole cancer profile
     cancerProfile.close()
@@ -343,6 +577,13 @@ if __name__ == "__main__":
             makedirs(cancer_dir)
             del cancer_dir
 
+        if streamPairs:
+            # Each pair is read from allMuts as the Pool asks for it
+            worker, tasks = create_csv_profile, generate_data_pairs(ctype)
+        else:
+            # Parse the mutations and disorder scores once, before the Pool forks
+            worker, tasks = create_shared_profile, load_shared_data(ctype)
+
         # Create a Pool with a life of 100 tasks each before replacement
         if cpu_count() < 16:
             # Set processes to size cpu_count(), local workaround
@@ -352,12 +593,22 @@ if __name__ == "__main__":
             pool = Pool(maxtasksperchild=100, processes=16)
 
         # Runs the function once per worker on the next available pair in the
-        # dataset
-        pool.map(create_csv_profile, generate_data_pairs(ctype))
+        # dataset, holding only a bounded window of pairs and results
+        # Each worker returns the catalog row of its profile, so the catalog
+        # is filled without reading the profiles back
+        profile_dir = path.join(dataDir, profilesName, now)
+        Catalog(path.join(profile_dir, catalogName)).add_profiles(
+            ctype, (row for row in bounded_imap_unordered(pool, worker, tasks)
+                    if row is not None))
 
         # Close the Pool
         pool.close()
 
         # Walk through the directory for each type in cancerTypes, concatenating
         # isoform files
-        concatenate_isoforms(ctype)
+        if not aggregateProfiles:
+            concatenate_isoforms(ctype)
+
+    # Gene, cancer, and cross-cancer views over every cancer type at once
+    if aggregateProfiles:
+        aggregate_profiles(path.join(dataDir, profilesName, now))
@@ -15,11 +15,19 @@
 #          http://www.geneontology.org/), the second is the blacklist for the  #
 #          evidence codes that should be excluded and the third optional       #
 #          argument is a list of genes                                         #
+#                                                                              #
+#          ./extractAnnotations.py --batch [--parallel] gene_association P,F   #
+#                                  IEA,ND,RCA,IPI idType outDir list1 ...      #
+#          parses the annotation file once for every namespace and list,       #
+#          writing outDir/GO_<BP|MF|CC>_<list>.txt for each pair; with         #
+#          --parallel each namespace is written by its own process             #
 # N.B.:    the format of the output is as follows:                             #
 #          ID TERM1 TERM2 ...                                                  #
 ################################################################################
 
+import os
 import sys
+from multiprocessing import Pool
 
 ################################################################################
 # CONSTANTS                                                                    #
@@ -28,6 +36,10 @@ import sys
 pos = {"id": 1, "symbol": 2, "qualifier": 3, "term": 4, "evidence": 6,
        "namespace": 8, "name": 10}
 allowedIdType = ["id", "symbol"]
+namespaceNames = {"P": "BP", "F": "MF", "C": "CC"}
+
+## set by extractBatch for writeNamespace, {namespace: [ann, dictID]}
+batchAnnotations = {}
 
 ################################################################################
 # FUNCTIONS                                                                    #
@@ -67,20 +79,23 @@ def parseGeneList(genesListFileName):
 
 ################################################################################
 
-def parseAnnFile(goAnnFileName, namespace, blacklist, idType):
+def parseAnnFileMulti(goAnnFileName, namespaces, blacklist, idType):
   """
-  parse the annotations file and return two dictionaries, one with the
-  annotations assigned to the primary IDs and the other with the gene names
-  assigned to the primary IDs
+  parse the annotations file once and return, for each namespace, the two
+  dictionaries of parseAnnFile
   """
-  ann = {}
-  dictID = {}
+  results = {}
+  for namespace in namespaces:
+    results[namespace] = [{}, {}]
+  blacklist = set(blacklist)
+
   goAnnFile = open(goAnnFileName, "r")
   goAnnFile = skipHeader(goAnnFile) # skip the header
   for line in goAnnFile:
     fields = line.split("\t")
-    if fields[pos["namespace"]] == namespace and not fields[pos["evidence"]] in\
+    if fields[pos["namespace"]] in results and not fields[pos["evidence"]] in\
        blacklist and fields[pos["qualifier"]] != "NOT":
+      ann, dictID = results[fields[pos["namespace"]]]
       if ann.has_key(fields[pos[idType]]):
         if not fields[pos["term"]] in ann[fields[pos[idType]]]:
           ann[fields[pos[idType]]].append(fields[pos["term"]])
@@ -92,45 +107,136 @@ def parseAnnFile(goAnnFileName, namespace, blacklist, idType):
   ## close the file
   goAnnFile.close()
 
-  return [ann, dictID]
+  return results
+
+################################################################################
+
+def parseAnnFile(goAnnFileName, namespace, blacklist, idType):
+  """
+  parse the annotations file and return two dictionaries, one with the
+  annotations assigned to the primary IDs and the other with the gene names
+  assigned to the primary IDs
+  """
+  return parseAnnFileMulti(goAnnFileName, [namespace], blacklist,
+                           idType)[namespace]
+
+################################################################################
+
+def selectAnnotations(ann, dictID, genesList=None):
+  """
+  return the output lines, either all the annotations by ID or, if a list of
+  genes is given, the annotations of the IDs named by one of them
+  """
+  lines = []
+  if genesList is not None:
+    genesList = set(genesList)
+
+  for id in ann:
+    if genesList is not None:
+      printAnn = False
+      genesNames = dictID[id].split("|")
+      for gene in genesNames:
+        if gene in genesList:
+          printAnn = gene
+          break
+      if printAnn:
+        lines.append(gene + "\t" + "\t".join(ann[id]))
+    else:
+      lines.append(id + "\t" + "\t".join(ann[id]))
+
+  return lines
+
+################################################################################
+
+def writeNamespace(args):
+  """
+  write the GO_<namespace>_<list>.txt file of every list of genes for one
+  namespace of the parsed annotations in batchAnnotations
+  """
+  namespace, outDir, genesListFileNames = args
+  ann, dictID = batchAnnotations[namespace]
+
+  for genesListFileName in genesListFileNames:
+    genesList = parseGeneList(genesListFileName)
+    listName = os.path.splitext(os.path.basename(genesListFileName))[0]
+    outFileName = os.path.join(outDir, "GO_" +
+                               namespaceNames.get(namespace, namespace) +
+                               "_" + listName + ".txt")
+    outFile = open(outFileName, "w")
+    for line in selectAnnotations(ann, dictID, genesList):
+      outFile.write(line + "\n")
+    outFile.close()
+
+################################################################################
+
+def extractBatch(goAnnFileName, namespaces, blacklist, idType, outDir,
+                 genesListFileNames, parallel=False):
+  """
+  write outDir/GO_<namespace>_<list>.txt for every namespace and list of
+  genes, parsing the annotations file only once; if parallel is set each
+  namespace is selected and written by its own process, which reads the
+  parsed annotations inherited from this one rather than a copy
+  """
+  global batchAnnotations
+
+  batchAnnotations = parseAnnFileMulti(goAnnFileName, namespaces, blacklist,
+                                       idType)
+
+  if not os.path.exists(outDir):
+    os.makedirs(outDir)
+
+  tasks = [(namespace, outDir, genesListFileNames) for namespace in namespaces]
+  if parallel:
+    ## the Pool is created after parsing, so the workers fork with the results
+    pool = Pool(len(namespaces))
+    pool.map(writeNamespace, tasks)
+    pool.close()
+    pool.join()
+  else:
+    for task in tasks:
+      writeNamespace(task)
 
 ################################################################################
 # MAIN PROGRAM                                                                 #
 ################################################################################
 
-## parse the parameters
-if len(sys.argv) < 5:
-  print "Usage: ./extractAnnotations.py gene_association namespace IEA,ND,RCA,IPI idType [genes list file]"
-  sys.exit(1)
-goAnnFileName, namespace, blacklist, idType = sys.argv[1:5]
-if len(sys.argv) == 6:
-  genesListFileName = sys.argv[5]
-  onlySelected = True
-  genesList = parseGeneList(genesListFileName)
-else:
-  onlySelected = False
-
-## make sure idType is one of ["id", "symbol"]
-if not idType in allowedIdType:
-  print "idType can only be one of: [" + ", ".join(allowedIdType) + "]"
-  sys.exit(1)
-
-## process the blacklist
-blacklist = blacklist.split(",")
-
-## parse the annotations file
-ann, dictID = parseAnnFile(goAnnFileName, namespace, blacklist, idType)
-
-## print the results (with the name of the gene)
-for id in ann:
-  if onlySelected:
-    printAnn = False
-    genesNames = dictID[id].split("|")
-    for gene in genesNames:
-      if gene in genesList:
-        printAnn = gene
-        break
-    if printAnn:
-      print gene + "\t" + "\t".join(ann[id])
+if __name__ == "__main__":
+  ## parse the parameters
+  if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+    parallel = len(sys.argv) > 2 and sys.argv[2] == "--parallel"
+    args = sys.argv[3:] if parallel else sys.argv[2:]
+    if len(args) < 6:
+      print "Usage: ./extractAnnotations.py --batch [--parallel] gene_association P,F IEA,ND,RCA,IPI idType outDir genesList1 [genesList2 ...]"
+      sys.exit(1)
+    goAnnFileName, namespaces, blacklist, idType, outDir = args[:5]
+    if not idType in allowedIdType:
+      print "idType can only be one of: [" + ", ".join(allowedIdType) + "]"
+      sys.exit(1)
+    extractBatch(goAnnFileName, namespaces.split(","), blacklist.split(","),
+                 idType, outDir, args[5:], parallel)
+    sys.exit(0)
+
+  if len(sys.argv) < 5:
+    print "Usage: ./extractAnnotations.py gene_association namespace IEA,ND,RCA,IPI idType [genes list file]"
+    sys.exit(1)
+  goAnnFileName, namespace, blacklist, idType = sys.argv[1:5]
+  if len(sys.argv) == 6:
+    genesListFileName = sys.argv[5]
+    genesList = parseGeneList(genesListFileName)
   else:
-    print id + "\t" + "\t".join(ann[id])
+    genesList = None
+
+  ## make sure idType is one of ["id", "symbol"]
+  if not idType in allowedIdType:
+    print "idType can only be one of: [" + ", ".join(allowedIdType) + "]"
+    sys.exit(1)
+
+  ## process the blacklist
+  blacklist = blacklist.split(",")
+
+  ## parse the annotations file
+  ann, dictID = parseAnnFile(goAnnFileName, namespace, blacklist, idType)
+
+  ## print the results (with the name of the gene)
+  for line in selectAnnotations(ann, dictID, genesList):
+    print line
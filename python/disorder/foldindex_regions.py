@@ -14,6 +14,8 @@ import csv
 import shutil
 import glob
 
+from bounded_pool import bounded_imap_unordered
+
 dataDir = "../../../disorderCancer/data/"  # Default relative path from pwd/current dir
 allMAFsName = "allMAFs"  # The name of the allMAFs dir in dataDir
 allMutsName = "allMuts"  # The name of the allMuts dir in dataDir
@@ -88,7 +90,7 @@ def create_foldindex_file((gene_w_isoform_num, fasta_sequence)):
     :type gene_w_isoform_num: str
     :type fasta_sequence: str
 
-    Run by Pool.map() with data from generate_pairs()
+    Run by bounded_imap_unordered() with data from generate_pairs()
     :return: file at output_directory/<gene_w_isoform_num>.csv
     each file is of the tsv format: ['Isoform', 'Start', 'End', 'Length', 'Score', 'STD']
     """
@@ -147,25 +149,17 @@ def generate_pairs(fasta_dir):
     :arg fasta_dir: a string representation of where the FASTA files are
     :type str
 
-    Builds an iterable list of data pairs for use with Pool.map()
-    Reads each file in fasta_directory and generates a:
+    Lazily generates data pairs for use with bounded_imap_unordered()
+    Reads each file in fasta_directory and yields a:
         (<GENE.ISOFORM #>, <FASTA Sequence>)
-    data pair
+    data pair, so only sequences in flight are held in memory
     """
 
     print("Generating data pairs")
 
-    # Define the return iterable
-    # Entries should be in form [[gene_w_iso_num, FASTA_sequence]]
-    # Each with full absolute path
-    datapairs = []
-
     # Collect fasta files with absolute path into fasta_filepaths
-    fasta_filepaths = []
-    for f in listdir(fasta_dir):
-        # Collect only fasta files
-        if ".fasta" in f:
-            fasta_filepaths.append(path.join(fasta_dir, f))
+    fasta_filepaths = (path.join(fasta_dir, f) for f in listdir(fasta_dir)
+                       if ".fasta" in f)
 
     # Process each FASTA file in turn
     for fasta_file in fasta_filepaths:
@@ -181,16 +175,34 @@ def generate_pairs(fasta_dir):
                 else:
                     sequence += line.strip()
 
-        datapairs.append([gene_w_iso_num, sequence])
+        # Entries should be in form [gene_w_iso_num, FASTA_sequence]
+        yield [gene_w_iso_num, sequence]
 
-    return datapairs
+
+def concatenate_regions(output_dir, cat_path):
+    """
+    :arg output_dir: Where the <GENE.ISOFORM #>.csv files are
+    :arg cat_path: The file all regions are concatenated into
+
+    :type output_dir: str
+    :type cat_path: str
+
+    :return: None, writes every region file in output_dir into cat_path
+    """
+    with open(cat_path, "w") as concat_file:
+        for filename in glob.glob(path.join(output_dir, "*")):
+            # Do not copy the concatenation into itself
+            if basename(filename) == basename(cat_path):
+                continue
+            with open(filename, 'r') as readfile:
+                shutil.copyfileobj(readfile, concat_file)
 
 
 if __name__ == "__main__":
     # Run the CLI wrapper to change global variables
     main()
 
-    # Run process in parallel via Pool.map()
+    # Run process in parallel via bounded_imap_unordered()
     # Create a Pool with a life of 100 tasks each before replacement
     if cpu_count() < 16:
         # Set processes to size cpu_count()-1, local workaround
@@ -199,17 +211,14 @@ if __name__ == "__main__":
         # Set processes size to 16 directly, remote workaround
         pool = Pool(maxtasksperchild=100, processes=16)
 
-    # Run the function pipeline once per entry in datapairs
-    pool.map(create_foldindex_file,
-             generate_pairs(fasta_dir=fasta_directory))
+    # Run the function pipeline once per data pair, holding only a bounded
+    # window of sequences in memory
+    for _ in bounded_imap_unordered(pool, create_foldindex_file,
+                                    generate_pairs(fasta_dir=fasta_directory)):
+        pass
 
     # Close the Pool
     pool.close()
 
     # Post-processing concatenation into cat_foldindex_csv
-    with open(cat_foldindex_path, "w") as concat_file:
-        for filename in glob.glob(path.join(output_directory, "*")):
-            if filename == basename(cat_foldindex_path):
-                continue
-            with open(filename, 'r') as readfile:
-                shutil.copyfileobj(readfile, concat_file)
+    concatenate_regions(output_directory, cat_foldindex_path)
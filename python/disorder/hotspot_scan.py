@@ -0,0 +1,230 @@
+#!/usr/bin/python
+
+# Name: Ryan Hagenson
+# Email: rhagenson@unomaha.edu
+
+import sys
+from csv import writer
+from datetime import datetime
+from getopt import GetoptError, getopt
+from os import path, makedirs
+
+import numpy
+
+from aggregate_profiles import load_profiles, summarySubDirName
+
+dataDir = ""  # Default False, should be overwritten at CLI
+profilesName = "profiles"  # The name of the final mutation profile csv's dir
+
+cancerTypes = ['BRCA']
+now = datetime.now().strftime("%d-%m-%y")  # Default run time
+windowSizes = [5, 11, 21]  # Window widths scanned, in residues
+permutations = 1000  # Random placements of each isoform's mutations
+batchSize = 5000000  # Most permuted mutations held in memory at one time
+seed = 0  # Seed for the permutations
+
+# Writes profiles/<now>/summary/<CANCER>_hotspots.tsv with one row per
+# isoform and window size: the densest window, its disorder, and the
+# permutation p-value of finding a window at least that dense by chance
+
+
+def main():
+    """
+    A simple wrapper for all CLI options
+    """
+    global dataDir, now, cancerTypes, windowSizes, permutations, seed
+
+    # Enables command-line options via getopt and sys packages
+    try:
+        opts, args = getopt(sys.argv[1:],
+                            'd:c:w:n:',
+                            ["date=", "dataDir=", "cancerTypes=", "windows=",
+                             "permutations=", "seed="]
+                            )
+    except GetoptError as err:
+        # Redirect STDERR to STDOUT (ensures screen display)
+        sys.stdout = sys.stderr
+        # Print help information
+        print(str(err))
+        # Exit
+        sys.exit(2)
+
+    # Configure the action of each CLI option
+    for (opt, arg) in opts:
+        if opt == "--date":
+            now = arg
+        elif opt in ("-d", "--dataDir"):
+            dataDir = arg
+        elif opt in ("-c", "--cancerTypes"):
+            cancerTypes = arg.split(',')
+        elif opt in ("-w", "--windows"):
+            windowSizes = [int(w) for w in arg.split(',')]
+        elif opt in ("-n", "--permutations"):
+            permutations = int(arg)
+        elif opt == "--seed":
+            seed = int(arg)
+
+
+def window_sums(values, width, starts, ends):
+    """
+    :arg values: Flat per-position values of every isoform, end to end
+    :arg width: Window width
+    :arg starts: Index in values where each window would begin
+    :arg ends: Index in values one past the end of that position's isoform
+
+    :return: (sum of each window, whether it fits within its isoform)
+    """
+    cumulative = numpy.r_[0, numpy.cumsum(values)]
+    fits = starts + width <= ends
+    stops = numpy.minimum(starts + width, len(values))
+    return cumulative[stops] - cumulative[starts], fits
+
+
+def null_max_counts(lengths, mutations, width, rng, n_permutations):
+    """
+    :arg lengths: Length of each isoform
+    :arg mutations: Number of mutations in each isoform
+    :arg width: Window width
+    :arg rng: numpy.random.RandomState to draw positions from
+    :arg n_permutations: Number of random placements
+
+    Places each isoform's mutations uniformly at random, as generate_log.R
+    samples positions, and finds the densest window of every isoform in
+    every placement at once: after one sort of the permuted positions the
+    count in the window starting at each mutation is a searchsorted away
+    :return: array of (n_permutations, isoforms) maximum window counts
+    """
+    n_isoforms = len(lengths)
+    offsets = numpy.r_[0, numpy.cumsum(lengths)]
+    total = offsets[-1]
+
+    iso_of_mut = numpy.repeat(numpy.arange(n_isoforms), mutations)
+    n_mutations = len(iso_of_mut)
+    result = numpy.zeros((n_permutations, n_isoforms), dtype=numpy.int64)
+    if n_mutations == 0:
+        return result
+
+    batch = max(1, min(n_permutations, batchSize // n_mutations))
+    for first in range(0, n_permutations, batch):
+        n = min(batch, n_permutations - first)
+
+        # Coordinates are unique per permutation and isoform, so one sort
+        # leaves every (permutation, isoform) group contiguous
+        shift = (numpy.arange(n, dtype=numpy.int64) * total)[:, None]
+        placed = (offsets[iso_of_mut] +
+                  (rng.random_sample((n, n_mutations)) *
+                   lengths[iso_of_mut]).astype(numpy.int64) + shift).ravel()
+        ends = (offsets[iso_of_mut + 1] + shift).ravel()
+        groups = (numpy.arange(n)[:, None] * n_isoforms + iso_of_mut).ravel()
+
+        order = numpy.argsort(placed)
+        placed, ends, groups = placed[order], ends[order], groups[order]
+
+        # Mutations within [position, position + width), cut at the isoform
+        counts = numpy.searchsorted(placed, numpy.minimum(placed + width, ends)) \
+            - numpy.arange(len(placed))
+
+        group_starts = numpy.flatnonzero(numpy.r_[True,
+                                                  groups[1:] != groups[:-1]])
+        result.ravel()[first * n_isoforms + groups[group_starts]] = \
+            numpy.maximum.reduceat(counts, group_starts)
+
+    return result
+
+
+def scan_hotspots(profiles, widths, n_permutations, rng):
+    """
+    :arg profiles: Arrays of a single cancer from load_profiles()
+    :arg widths: Window widths to scan
+    :arg n_permutations: Number of random placements for the p-values
+    :arg rng: numpy.random.RandomState to draw positions from
+
+    Window mutation counts and mean disorder for every isoform come from
+    cumulative sums over the flat arrays, in one pass per width
+    :return: list of rows, one per mutated isoform and width
+    """
+    muts = profiles["muts"]
+    score = profiles["score"]
+    isoform = profiles["isoform"]
+    if len(muts) == 0:
+        return []
+
+    # Each isoform is one contiguous segment of the flat arrays
+    seg_starts = numpy.flatnonzero(numpy.r_[True, isoform[1:] != isoform[:-1]])
+    lengths = numpy.diff(numpy.r_[seg_starts, len(muts)])
+    seg_ends = seg_starts + lengths
+    segment = numpy.repeat(numpy.arange(len(seg_starts)), lengths)
+
+    mutations = numpy.add.reduceat(muts, seg_starts)
+    mean_disorder = numpy.add.reduceat(score, seg_starts) / lengths
+
+    rows = []
+    positions = numpy.arange(len(muts))
+    for width in widths:
+        counts, fits = window_sums(muts, width, positions, seg_ends[segment])
+        disorder = window_sums(score, width, positions,
+                               seg_ends[segment])[0] / float(width)
+
+        # The densest full window of each isoform, first one on ties
+        counts = numpy.where(fits, counts, -1)
+        best = numpy.maximum.reduceat(counts, seg_starts)
+        at_best = numpy.flatnonzero(counts == best[segment])
+        scanned, first = numpy.unique(segment[at_best], return_index=True)
+        best_start = at_best[first]
+
+        # Only mutated isoforms at least width long are tested
+        tested = scanned[best[scanned] > 0]
+        best_start = best_start[best[scanned] > 0]
+
+        null = null_max_counts(lengths[tested], mutations[tested], width,
+                               rng, n_permutations)
+        exceed = (null >= best[tested]).sum(axis=0)
+        p_values = (exceed + 1.0) / (n_permutations + 1)
+
+        for (i, seg) in enumerate(tested):
+            start = best_start[i]
+            rows.append([profiles["isoforms"][isoform[start]],
+                         width,
+                         profiles["position"][start],
+                         profiles["position"][start + width - 1],
+                         int(best[seg]),
+                         "%.4f" % (best[seg] / float(width)),
+                         "%.4f" % disorder[start],
+                         "%.4f" % mean_disorder[seg],
+                         int(mutations[seg]),
+                         "%g" % p_values[i]])
+
+    return rows
+
+
+def scan_cancer(profile_dir, ctype):
+    """
+    :arg profile_dir: The profiles/<now> directory to read
+    :arg ctype: Which cancer to scan
+
+    :return: None, writes profile_dir/summary/<ctype>_hotspots.tsv
+    """
+    print("Scanning for hotspots in: " + ctype)
+
+    profiles = load_profiles(profile_dir, [ctype])
+    rows = scan_hotspots(profiles, windowSizes, permutations,
+                         numpy.random.RandomState(seed))
+
+    summary_dir = path.join(profile_dir, summarySubDirName)
+    if not path.exists(summary_dir):
+        makedirs(summary_dir)
+
+    with open(path.join(summary_dir, ctype + "_hotspots.tsv"), 'w') as FILE:
+        table = writer(FILE, delimiter='\t')
+        table.writerow(["Isoform", "Window", "Start", "End", "Mutations",
+                        "Density", "WindowDisorder", "IsoformDisorder",
+                        "IsoformMutations", "P-val"])
+        table.writerows(rows)
+
+
+if __name__ == "__main__":
+    # Run the CLI wrapper to change global variables
+    main()
+
+    for ctype in cancerTypes:
+        scan_cancer(path.join(dataDir, profilesName, now), ctype)
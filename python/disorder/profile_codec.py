@@ -0,0 +1,293 @@
+#!/usr/bin/python
+
+# Name: Ryan Hagenson
+# Email: rhagenson@unomaha.edu
+
+import sys
+from getopt import GetoptError, getopt
+from os import path, walk, remove
+from re import compile
+from struct import Struct
+
+import numpy
+
+binaryExtension = ".bprof"  # Binary counterpart of a .prof file
+textExtension = ".prof"
+scoreScale = 10000  # IUPred scores have 4 decimals, stored as uint16
+keepSource = False  # Keep the original file when converting
+
+# Captures three groups from an individual isoform profile name:
+# .group(1): gene name
+# .group(2): isoform number
+# .group(3): long or short
+isoform_prof_re = compile('^(.+)\.(\d+)\.(long|short)\.b?prof$')
+
+# A .bprof file holds, little-endian and in this order:
+# header: magic "BPRF", version, flags, number of rows, first position,
+#         number of mutated rows
+# position deltas: int32 per row after the first, absent when FLAG_IMPLICIT
+#                  as positions are then first, first + 1, ...
+# residues: one byte per row, the amino acid 1-letter code
+# scores: uint16 per row, the disorder score times scoreScale
+# mutations: uint32 row index per mutated row, then uint32 count per
+#            mutated row, so unmutated rows cost nothing
+
+# The Python stages read either format, preferring .bprof when an isoform has
+# both (e.g. after --keep), but the R stages (build_all_logs.R,
+# build_disorder_table.R) only read text and list files matching "*.prof",
+# which .bprof also matches: run profile_codec.py --text on a tree of
+# binary profiles before handing it to R
+header = Struct("<4sBBxxIiI")
+magic = "BPRF"
+version = 1
+FLAG_IMPLICIT = 1
+
+
+def main():
+    """
+    A simple wrapper for all CLI options
+
+    Convert every .prof below a directory to .bprof, or back with --text:
+        profile_codec.py [--text] [--keep] <dir> [<dir> ...]
+    """
+    global keepSource
+
+    # Enables command-line options via getopt and sys packages
+    try:
+        opts, args = getopt(sys.argv[1:],
+                            'tk',
+                            ["text", "keep"]
+                            )
+    except GetoptError as err:
+        # Redirect STDERR to STDOUT (ensures screen display)
+        sys.stdout = sys.stderr
+        # Print help information
+        print(str(err))
+        # Exit
+        sys.exit(2)
+
+    to_text = False
+
+    # Configure the action of each CLI option
+    for (opt, arg) in opts:
+        if opt in ("-t", "--text"):
+            to_text = True
+        elif opt in ("-k", "--keep"):
+            keepSource = True
+
+    return to_text, args
+
+
+def encode_profile(positions, residues, scores, muts):
+    """
+    :arg positions: Position of each row
+    :arg residues: Amino acid 1-letter code of each row, as bytes or uint8
+    :arg scores: Disorder score of each row
+    :arg muts: Number of mutations at each row
+
+    :type positions: numpy.ndarray
+    :type residues: str or numpy.ndarray
+    :type scores: numpy.ndarray
+    :type muts: numpy.ndarray
+
+    :return: str, the contents of a .bprof file
+    """
+    positions = numpy.asarray(positions, dtype=numpy.int64)
+    muts = numpy.asarray(muts)
+    n_rows = len(positions)
+
+    deltas = numpy.diff(positions)
+    flags = FLAG_IMPLICIT if numpy.all(deltas == 1) else 0
+    mutated = numpy.flatnonzero(muts)
+
+    parts = [header.pack(magic, version, flags, n_rows,
+                         int(positions[0]) if n_rows else 0, len(mutated))]
+    if not flags & FLAG_IMPLICIT:
+        parts.append(deltas.astype("<i4").tostring())
+    parts.append(numpy.frombuffer(residues, dtype=numpy.uint8).tostring()
+                 if isinstance(residues, str)
+                 else numpy.asarray(residues, dtype=numpy.uint8).tostring())
+    parts.append(numpy.rint(numpy.asarray(scores) * scoreScale)
+                 .astype("<u2").tostring())
+    parts.append(mutated.astype("<u4").tostring())
+    parts.append(muts[mutated].astype("<u4").tostring())
+
+    return "".join(parts)
+
+
+def decode_profile(data):
+    """
+    :arg data: The contents of a .bprof file
+    :type data: str
+
+    :return: dict of arrays (position, residue, score, muts), one entry per
+    row, residue being the uint8 code of each amino acid
+    """
+    (file_magic, file_version, flags, n_rows, first,
+     n_mutated) = header.unpack_from(data)
+    if file_magic != magic or file_version != version:
+        raise ValueError("Not a version " + str(version) + " " +
+                         binaryExtension + " file")
+
+    offset = header.size
+    if flags & FLAG_IMPLICIT:
+        position = numpy.arange(first, first + n_rows, dtype=numpy.int64)
+    else:
+        deltas = numpy.frombuffer(data, dtype="<i4", count=max(n_rows - 1, 0),
+                                  offset=offset)
+        offset += deltas.nbytes
+        position = numpy.r_[0, numpy.cumsum(deltas)][:n_rows] + first
+
+    residue = numpy.frombuffer(data, dtype=numpy.uint8, count=n_rows,
+                               offset=offset)
+    offset += residue.nbytes
+    score = numpy.frombuffer(data, dtype="<u2", count=n_rows,
+                             offset=offset) / float(scoreScale)
+    offset += 2 * n_rows
+    rows = numpy.frombuffer(data, dtype="<u4", count=n_mutated, offset=offset)
+    offset += rows.nbytes
+    counts = numpy.frombuffer(data, dtype="<u4", count=n_mutated,
+                              offset=offset)
+
+    muts = numpy.zeros(n_rows, dtype=numpy.int64)
+    muts[rows] = counts
+
+    return {"position": position,
+            "residue": residue,
+            "score": score,
+            "muts": muts}
+
+
+def write_profile(profile_file, positions, residues, scores, muts):
+    """
+    :arg profile_file: Path of the .bprof file to write
+
+    See encode_profile() for the remaining arguments
+    :return: None, writes profile_file
+    """
+    with open(profile_file, 'wb') as FILE:
+        FILE.write(encode_profile(positions, residues, scores, muts))
+
+
+def read_profile(profile_file):
+    """
+    :arg profile_file: Path of a .bprof file
+    :type profile_file: str
+
+    :return: dict of arrays, as decode_profile()
+    """
+    with open(profile_file, 'rb') as FILE:
+        return decode_profile(FILE.read())
+
+
+def load_columns(profile_file):
+    """
+    :arg profile_file: Path of a .prof or .bprof file
+    :type profile_file: str
+
+    For readers of either format, the residue column is not needed by them
+    :return: (position, score, muts) arrays
+    """
+    if profile_file.endswith(binaryExtension):
+        profile = read_profile(profile_file)
+        return profile["position"], profile["score"], profile["muts"]
+
+    # loadtxt cannot shape the columns of an empty file
+    if path.getsize(profile_file) == 0:
+        return (numpy.zeros(0, dtype=int), numpy.zeros(0),
+                numpy.zeros(0, dtype=int))
+
+    rows = numpy.loadtxt(profile_file, delimiter='\t', usecols=(0, 2, 3),
+                         ndmin=2)
+    return rows[:, 0].astype(int), rows[:, 1], rows[:, 2].astype(int)
+
+
+def isoform_profiles(filenames):
+    """
+    :arg filenames: Names of the files in one directory
+    :type filenames: list
+
+    Skips concatenated GENE.long.prof and CANCER.prof files, and keeps one
+    profile per isoform, the .bprof if it has both
+    :return: sorted list of (filename, isoform_prof_re match)
+    """
+    profiles = {}  # {GENE.XXX.long|short: (filename, match)}
+    for fname in filenames:
+        isoform_match = isoform_prof_re.search(fname)
+        if not isoform_match:
+            continue
+
+        isoform = ".".join(isoform_match.group(1, 2, 3))
+        if isoform not in profiles or fname.endswith(binaryExtension):
+            profiles[isoform] = (fname, isoform_match)
+
+    return [profiles[isoform] for isoform in sorted(profiles)]
+
+
+def profile_lines(profile_file):
+    """
+    :arg profile_file: Path of a .prof or .bprof file
+    :type profile_file: str
+
+    :return: generator of the tab separated text lines of the profile
+    """
+    if not profile_file.endswith(binaryExtension):
+        with open(profile_file, 'r') as FILE:
+            for line in FILE:
+                yield line
+        return
+
+    profile = read_profile(profile_file)
+    for row in zip(profile["position"].tolist(),
+                   profile["residue"].tostring(),
+                   profile["score"].tolist(),
+                   profile["muts"].tolist()):
+        yield "%d\t%s\t%.4f\t%d\r\n" % row
+
+
+def convert_tree(profile_dir, to_text=False):
+    """
+    :arg profile_dir: Directory searched for individual isoform profiles
+    :arg to_text: Write .prof from .bprof rather than the reverse
+
+    :type profile_dir: str
+    :type to_text: bool
+
+    :return: None, writes the converted copy next to each profile
+    """
+    source, target = ((binaryExtension, textExtension) if to_text
+                      else (textExtension, binaryExtension))
+
+    for (dirpath, dirnames, filenames) in walk(profile_dir):
+        for fname in filenames:
+            if not fname.endswith(source) or not isoform_prof_re.search(fname):
+                continue  # Concatenated GENE.long.prof or CANCER.prof
+
+            profile_file = path.join(dirpath, fname)
+            converted = profile_file[:-len(source)] + target
+
+            if to_text:
+                with open(converted, 'w') as FILE:
+                    FILE.writelines(profile_lines(profile_file))
+            else:
+                # Text profiles hold the residue, so read all four columns
+                with open(profile_file, 'r') as FILE:
+                    rows = [line.rstrip("\r\n").split("\t") for line in FILE]
+                columns = zip(*rows) or [[], [], [], []]
+                write_profile(converted,
+                              numpy.array(columns[0], dtype=int),
+                              "".join(columns[1]),
+                              numpy.array(columns[2], dtype=float),
+                              numpy.array(columns[3], dtype=int))
+
+            if not keepSource:
+                remove(profile_file)
+
+
+if __name__ == "__main__":
+    # Run the CLI wrapper to change global variables
+    to_text, profile_dirs = main()
+
+    for profile_dir in profile_dirs:
+        print("Converting profiles within: " + profile_dir)
+        convert_tree(profile_dir, to_text)
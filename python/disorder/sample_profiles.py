@@ -0,0 +1,246 @@
+#!/usr/bin/python
+
+# Name: Ryan Hagenson
+# Email: rhagenson@unomaha.edu
+
+import sys
+from csv import writer
+from datetime import datetime
+from getopt import GetoptError, getopt
+from hashlib import sha256
+from multiprocessing import Pool, cpu_count
+from os import path, makedirs, walk
+
+import numpy
+
+from bounded_pool import bounded_imap_unordered
+from catalog import Catalog, catalogName
+from profile_codec import isoform_prof_re, isoform_profiles, load_columns
+
+dataDir = ""  # Default False, should be overwritten at CLI
+profilesName = "profiles"  # The name of the final mutation profile csv's dir
+outputsDir = "../../R/outputs/"  # Where LOGs are written, as build_all_logs.R
+
+cancerTypes = ['BRCA']
+now = datetime.now().strftime("%d-%m-%y")  # Default run time
+number = 1000000  # The number of samples to take for each profile
+chunkSamples = 50000  # Samples per task, fixed whatever the number of workers
+drawBatch = 10000000  # Most scores drawn into memory at one time
+
+# Set in each worker, so consecutive chunks of a profile read it only once
+cachedProfile = (None, None, None)  # (profile path, scores, mutations)
+
+# Mirrors R-defs/generate_log.R, the LOGs are written to:
+# ./<outputsDir>/<now>/<CANCER>/<GENE.long|short>/<GENE.XXX.long|short>/LOG.csv
+# A profile's samples are split into chunks of chunkSamples, chunk i drawing
+# from a RandomState seeded by hashing "<now>/<CANCER>/<isoform>/<i>", so a
+# run is bit-reproducible with any number of workers
+
+
+def main():
+    """
+    A simple wrapper for all CLI options
+    """
+    global dataDir, now, cancerTypes, number, outputsDir
+
+    # Enables command-line options via getopt and sys packages
+    try:
+        opts, args = getopt(sys.argv[1:],
+                            'd:c:n:o:',
+                            ["date=", "dataDir=", "cancerTypes=", "number=",
+                             "outputs="]
+                            )
+    except GetoptError as err:
+        # Redirect STDERR to STDOUT (ensures screen display)
+        sys.stdout = sys.stderr
+        # Print help information
+        print(str(err))
+        # Exit
+        sys.exit(2)
+
+    # Configure the action of each CLI option
+    for (opt, arg) in opts:
+        if opt == "--date":
+            now = arg
+        elif opt in ("-d", "--dataDir"):
+            dataDir = arg
+        elif opt in ("-c", "--cancerTypes"):
+            cancerTypes = arg.split(',')
+        elif opt in ("-n", "--number"):
+            number = int(float(arg))  # Allow 1e6 as R does
+        elif opt in ("-o", "--outputs"):
+            outputsDir = arg
+
+
+def chunk_rng(ctype, isoform, chunk):
+    """
+    :arg ctype: The cancer type of the profile
+    :arg isoform: The isoform of the profile, e.g. TP53.001.long
+    :arg chunk: Which chunk of the profile's samples
+
+    :type ctype: str
+    :type isoform: str
+    :type chunk: int
+
+    :return: numpy.random.RandomState for this chunk alone
+    """
+    key = "/".join([now, ctype, isoform, str(chunk)])
+    return numpy.random.RandomState(
+        numpy.frombuffer(sha256(key).digest(), dtype=numpy.uint32))
+
+
+def read_profile(profile_file):
+    """
+    :return: (disorder scores, mutations) columns of a .prof or .bprof file
+    """
+    global cachedProfile
+
+    if cachedProfile[0] != profile_file:
+        position, score, muts = load_columns(profile_file)
+        cachedProfile = (profile_file, score, muts)
+
+    return cachedProfile[1], cachedProfile[2]
+
+
+def sample_chunk((profile_file, ctype, isoform, chunk, samples)):
+    """
+    :arg profile_file: Path to an individual isoform .prof file
+    :arg ctype: The cancer type of the profile
+    :arg isoform: The isoform of the profile, e.g. TP53.001.long
+    :arg chunk: Which chunk of the profile's samples
+    :arg samples: The number of samples in this chunk
+
+    Run by bounded_imap_unordered() with data from generate_chunks()
+    Each sample is the total disorder of as many positions as the profile
+    has mutations, drawn with replacement as generate_log.R does
+    :return: (profile_file, chunk, sum of samples, samples <= and >= the
+    observed level, observed level, number of mutations)
+    """
+    scores, muts = read_profile(profile_file)
+    real_level = numpy.sum(scores * muts)
+    num_mutations = int(muts.sum())
+
+    rng = chunk_rng(ctype, isoform, chunk)
+    total, less, more = 0.0, 0, 0
+
+    # Draw in batches so profiles with many mutations stay within memory
+    per_batch = max(1, drawBatch // max(num_mutations, 1))
+    for first in range(0, samples, per_batch):
+        n = min(per_batch, samples - first)
+        if num_mutations == 0:
+            normal = numpy.zeros(n)
+        else:
+            normal = scores[rng.randint(0, len(scores),
+                                        size=(n, num_mutations))].sum(axis=1)
+        total += normal.sum()
+        less += numpy.count_nonzero(real_level <= normal)
+        more += numpy.count_nonzero(real_level >= normal)
+
+    return profile_file, chunk, total, less, more, real_level, num_mutations
+
+
+def generate_chunks(ctype):
+    """
+    :arg ctype: Which cancer is currently being processed
+    :type ctype: str
+
+    Lazily generates one task per chunk of every isoform profile in ctype
+    """
+    cancer_dir = path.join(dataDir, profilesName, now, ctype)
+
+    for (dirpath, dirnames, filenames) in walk(cancer_dir):
+        for (fname, isoform_match) in isoform_profiles(filenames):
+            isoform = ".".join(isoform_match.group(1, 2, 3))
+            for (chunk, first) in enumerate(range(0, number, chunkSamples)):
+                yield (path.join(dirpath, fname), ctype, isoform, chunk,
+                       min(chunkSamples, number - first))
+
+
+def write_log(profile_file, results):
+    """
+    :arg profile_file: Path to an individual isoform .prof file
+    :arg results: Every sample_chunk() result of the profile, in any order
+
+    :return: the row Catalog.add_logs() records for the LOG, writing the
+    LOG.csv of the profile, one row in the columns:
+        1. isoform name
+        2. observed disorder score
+        3. average random disorder score
+        4. total number of mutations
+        5. empirical p-value
+        6. Direction of p-value, '+' meaning the observed is above average
+    """
+    # Summed in chunk order, so the float total is the same however the
+    # chunks arrived
+    results = sorted(results, key=lambda result: result[1])
+    real_level, num_mutations = results[0][5], results[0][6]
+    total = sum(result[2] for result in results)
+    less = sum(result[3] for result in results)
+    more = sum(result[4] for result in results)
+
+    avg_disorder = round(total / number, 3)
+    less_p = less / float(number)
+    more_p = more / float(number)
+    if more_p < less_p:
+        p_value, direction = more_p, "+"
+    else:
+        p_value, direction = less_p, "-"
+
+    # <now>/<CANCER>/<GENE.long|short> below profiles/, as generate_log.R
+    log_tree = path.relpath(path.dirname(profile_file),
+                            path.join(dataDir, profilesName))
+    isoform = ".".join(isoform_prof_re.search(
+        path.basename(profile_file)).group(1, 2, 3))
+    log_dir = path.join(outputsDir, log_tree, isoform)
+    if not path.exists(log_dir):
+        makedirs(log_dir)
+
+    with open(path.join(log_dir, "LOG.csv"), 'w') as FILE:
+        writer(FILE, delimiter=',').writerow([isoform,
+                                              "%.15g" % real_level,
+                                              "%.15g" % avg_disorder,
+                                              num_mutations,
+                                              "%.15g" % p_value,
+                                              direction])
+
+    isoform_name, long_short = path.splitext(isoform)
+    return (log_tree.split(path.sep)[1], isoform_name, long_short[1:],
+            path.join(log_dir, "LOG.csv"), 0, real_level, avg_disorder,
+            num_mutations, p_value, direction)
+
+
+if __name__ == "__main__":
+    # Run the CLI wrapper to change global variables
+    main()
+
+    n_chunks = len(range(0, number, chunkSamples))
+
+    for ctype in cancerTypes:
+        print("Sampling profiles for: " + ctype)
+
+        # Create a Pool with a life of 100 tasks each before replacement
+        if cpu_count() < 16:
+            # Set processes to size cpu_count(), local workaround
+            pool = Pool(maxtasksperchild=100)
+        else:
+            # Set processes size to 16 directly, remote workaround
+            pool = Pool(maxtasksperchild=100, processes=16)
+
+        # Chunks of one profile finish in any order on any worker, they are
+        # only merged once all have arrived
+        pending = {}  # {profile_file: {chunk: result}}
+        log_rows = []
+        for result in bounded_imap_unordered(pool, sample_chunk,
+                                             generate_chunks(ctype)):
+            chunks = pending.setdefault(result[0], {})
+            chunks[result[1]] = result
+            if len(chunks) == n_chunks:
+                log_rows.append(write_log(result[0], chunks.values()))
+                del pending[result[0]]
+
+        # Close the Pool
+        pool.close()
+
+        # Record the LOGs in the catalog next to the profiles they sample
+        Catalog(path.join(dataDir, profilesName, now,
+                          catalogName)).add_logs(log_rows)
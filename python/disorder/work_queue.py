@@ -0,0 +1,454 @@
+#!/usr/bin/python
+
+# Name: Ryan Hagenson
+# Email: rhagenson@unomaha.edu
+
+import json
+import sqlite3
+import sys
+import time
+from getopt import GetoptError, getopt
+from itertools import islice
+from multiprocessing import Process
+from os import path, makedirs, getpid
+from shutil import rmtree
+from socket import gethostname
+
+from catalog import Catalog, catalogName
+
+queueDir = ""  # Directory on shared storage holding the queue, set at CLI
+queueName = "queue.sqlite"
+leaseSeconds = 30 * 60  # Time a worker has to finish a task before it is retried
+maxAttempts = 3  # Tasks failing this many times are left as 'failed'
+putBatch = 10000  # Tasks added per transaction by the coordinator
+pollSeconds = 5  # Time an idle worker waits while the queue is still filling
+
+# Queue directory contains:
+# ./queue.sqlite
+#   tasks: one row per data pair, with its lease and attempt count
+#   config: the settings the coordinator ran with (dataDir, date, ...)
+
+# The shared storage must honor POSIX locks for sqlite, NFS needs its
+# lock daemon running (as on the cluster home directories)
+
+
+class WorkQueue(object):
+    """
+    A work queue in an sqlite file on shared storage
+    Any number of workers on any node claim tasks under a lease, a task whose
+    lease expires (e.g. its node died) is handed out again until it has been
+    attempted maxAttempts times
+    """
+
+    def __init__(self, queue_dir, lease=leaseSeconds, attempts=maxAttempts):
+        """
+        :arg queue_dir: Directory holding queue.sqlite, created if needed
+        :arg lease: Seconds a claimed task is held before being retried
+        :arg attempts: Number of claims before a task is marked failed
+
+        :type queue_dir: str
+        :type lease: int
+        :type attempts: int
+        """
+        if not path.exists(queue_dir):
+            makedirs(queue_dir)
+
+        self.lease = lease
+        self.attempts = attempts
+
+        # Autocommit, transactions are opened explicitly with BEGIN IMMEDIATE
+        self.db = sqlite3.connect(path.join(queue_dir, queueName),
+                                  timeout=120, isolation_level=None)
+        self.db.execute("CREATE TABLE IF NOT EXISTS tasks ("
+                        "id INTEGER PRIMARY KEY, "
+                        "stage TEXT NOT NULL, "
+                        "payload TEXT NOT NULL, "
+                        "state TEXT NOT NULL DEFAULT 'pending', "
+                        "worker TEXT, "
+                        "lease_expires REAL, "
+                        "attempts INTEGER NOT NULL DEFAULT 0, "
+                        "error TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS tasks_state "
+                        "ON tasks (state, lease_expires)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS config ("
+                        "key TEXT PRIMARY KEY, value TEXT)")
+
+    def set_config(self, **settings):
+        """
+        Records the settings workers need, e.g. dataDir and date
+        """
+        self.db.executemany("INSERT OR REPLACE INTO config VALUES (?, ?)",
+                            settings.items())
+
+    def config(self):
+        """
+        :return: dict of the settings recorded by set_config()
+        """
+        return dict(self.db.execute("SELECT key, value FROM config"))
+
+    def put(self, stage, payloads):
+        """
+        :arg stage: Which stage runs the payloads, a key of stageRunners
+        :arg payloads: Iterable of JSON-serializable data pairs
+
+        :type stage: str
+        :type payloads: iterable
+
+        Consumes payloads lazily, committing every putBatch tasks so workers
+        can start on the first batch while the rest are generated
+        """
+        payloads = iter(payloads)
+        while True:
+            batch = [(stage, json.dumps(payload))
+                     for payload in islice(payloads, putBatch)]
+            if not batch:
+                break
+
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.executemany("INSERT INTO tasks (stage, payload) "
+                                "VALUES (?, ?)", batch)
+            self.db.execute("COMMIT")
+
+    def claim(self, worker):
+        """
+        :arg worker: Name of the claiming worker, recorded for bug tracking
+        :type worker: str
+
+        :return: (task id, stage, payload) or None if nothing can be claimed
+        """
+        now = time.time()
+
+        # BEGIN IMMEDIATE takes the write lock, so no two workers see the
+        # same pending row
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            # Leases that ran out on their final attempt will not be retried
+            self.db.execute("UPDATE tasks SET state = 'failed', "
+                            "error = 'lease expired' "
+                            "WHERE state = 'leased' AND lease_expires < ? "
+                            "AND attempts >= ?", (now, self.attempts))
+
+            row = self.db.execute("SELECT id, stage, payload FROM tasks "
+                                  "WHERE state = 'pending' "
+                                  "OR (state = 'leased' AND lease_expires < ?) "
+                                  "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE tasks SET state = 'leased', "
+                                "worker = ?, lease_expires = ?, "
+                                "attempts = attempts + 1 WHERE id = ?",
+                                (worker, now + self.lease, row[0]))
+            self.db.execute("COMMIT")
+        except sqlite3.Error:
+            self.db.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def complete(self, task_id, worker):
+        """
+        Marks a claimed task as done
+
+        Only while worker still holds the lease, a worker that outlived its
+        lease must not overwrite the task once another worker has claimed it
+        :return: whether the task was marked done
+        """
+        return self.db.execute("UPDATE tasks SET state = 'done', "
+                               "lease_expires = NULL WHERE id = ? "
+                               "AND worker = ? AND state = 'leased'",
+                               (task_id, worker)).rowcount == 1
+
+    def release(self, task_id, worker, error):
+        """
+        Returns a task that raised to the queue, or fails it when it has
+        used up its attempts
+
+        Only while worker still holds the lease, as complete()
+        :return: whether the task was released
+        """
+        return self.db.execute("UPDATE tasks SET "
+                               "state = CASE WHEN attempts >= ? "
+                               "THEN 'failed' ELSE 'pending' END, "
+                               "lease_expires = NULL, error = ? WHERE id = ? "
+                               "AND worker = ? AND state = 'leased'",
+                               (self.attempts, error, task_id,
+                                worker)).rowcount == 1
+
+    def counts(self):
+        """
+        :return: dict of {state: number of tasks}
+        """
+        return dict(self.db.execute("SELECT state, COUNT(*) FROM tasks "
+                                    "GROUP BY state"))
+
+
+def coordinate_profiles(queue, data_dir, date, cancer_types, binary=False):
+    """
+    :arg queue: The WorkQueue to fill
+    :arg data_dir: The dataDir workers read allMuts and refSeq from
+    :arg date: The profiles/<date> run being built
+    :arg cancer_types: Which cancers to enqueue pairs for
+    :arg binary: Workers write .bprof rather than .prof
+
+    :type queue: WorkQueue
+    :type data_dir: str
+    :type date: str
+    :type cancer_types: list
+    :type binary: bool
+
+    Shards the data pairs from generate_data_pairs() into the queue
+    """
+    import create_csv_profile as profile
+
+    profile.dataDir = data_dir
+    profile.now = date
+    queue.set_config(dataDir=data_dir, date=date,
+                     cancerTypes=",".join(cancer_types),
+                     binary="1" if binary else "0", filling="1")
+
+    for ctype in cancer_types:
+        # Create the CANCER root or clear the CANCER root
+        cancer_dir = path.join(data_dir, profile.profilesName, date, ctype)
+        if path.exists(cancer_dir):
+            rmtree(cancer_dir)
+        makedirs(cancer_dir)
+
+        queue.put("profile", profile.generate_data_pairs(ctype))
+
+    # Workers with nothing to claim may now exit
+    queue.set_config(filling="0")
+
+
+def coordinate_foldindex(queue, fasta_dir, output_dir):
+    """
+    :arg queue: The WorkQueue to fill
+    :arg fasta_dir: Where the FASTA files are
+    :arg output_dir: Where workers write <GENE.ISOFORM #>.csv files
+
+    :type queue: WorkQueue
+    :type fasta_dir: str
+    :type output_dir: str
+
+    Shards the data pairs from foldindex_regions.generate_pairs() into the queue
+    """
+    import foldindex_regions as foldindex
+
+    if not path.exists(output_dir):
+        makedirs(output_dir)
+    queue.set_config(outputDir=output_dir, filling="1")
+
+    queue.put("foldindex", foldindex.generate_pairs(fasta_dir))
+
+    # Workers with nothing to claim may now exit
+    queue.set_config(filling="0")
+
+
+def run_profile(config, payload):
+    """
+    Runs create_csv_profile() on one queued data pair
+
+    create_csv_profile() prints and returns when an input cannot be opened,
+    so a missing profile is raised here for the task to be retried
+    """
+    import create_csv_profile as profile
+
+    profile.dataDir = config["dataDir"]
+    profile.now = config["date"]
+    profile.binaryProfiles = config.get("binary") == "1"
+    profile.create_csv_profile(tuple(payload))
+
+    if profile.binaryProfiles:
+        extension = profile.binaryExtension
+    else:
+        extension = ".prof"
+    if not path.isfile(profile.profile_path(*payload, extension=extension)):
+        raise IOError("No profile written for " + " ".join(payload))
+
+
+def run_foldindex(config, payload):
+    """
+    Runs create_foldindex_file() on one queued data pair
+    """
+    import foldindex_regions as foldindex
+
+    foldindex.output_directory = config["outputDir"]
+    foldindex.create_foldindex_file(tuple(payload))
+
+
+# The function each worker runs for the tasks of a stage
+stageRunners = {"profile": run_profile,
+                "foldindex": run_foldindex}
+
+
+def finish(queue):
+    """
+    :arg queue: A WorkQueue whose tasks have all been worked
+    :type queue: WorkQueue
+
+    Runs the post-processing each stage normally does after Pool.close()
+    :return: None, exits if tasks are still pending or leased
+    """
+    counts = queue.counts()
+    if counts.get("pending", 0) or counts.get("leased", 0):
+        print("Queue is not drained: " + str(counts))
+        sys.exit(1)
+
+    config = queue.config()
+    stages = [row[0] for row in
+              queue.db.execute("SELECT DISTINCT stage FROM tasks")]
+
+    if "profile" in stages:
+        import create_csv_profile as profile
+
+        profile.dataDir = config["dataDir"]
+        profile.now = config["date"]
+        for ctype in config["cancerTypes"].split(','):
+            profile.concatenate_isoforms(ctype)
+
+        # The workers' rows were not kept, so the profiles are read back
+        profile_dir = path.join(config["dataDir"], profile.profilesName,
+                                config["date"])
+        Catalog(path.join(profile_dir, catalogName)).index_profiles(
+            profile_dir, config["cancerTypes"].split(','))
+
+    if "foldindex" in stages:
+        import foldindex_regions as foldindex
+
+        foldindex.concatenate_regions(config["outputDir"],
+                                      path.join(config["outputDir"],
+                                                "all_regions.csv"))
+
+
+def work(queue_dir):
+    """
+    :arg queue_dir: Directory holding queue.sqlite
+    :type queue_dir: str
+
+    Claims and runs tasks until the coordinator has finished filling the
+    queue and no task is pending or leased
+    """
+    queue = WorkQueue(queue_dir)
+    worker = gethostname() + ":" + str(getpid())
+
+    while True:
+        # Re-read each time, the coordinator may still be adding settings
+        config = queue.config()
+
+        claimed = queue.claim(worker)
+        if claimed is None:
+            # Stay while other leases are out, they may yet be retried
+            if (config.get("filling") == "0" and
+                    not queue.counts().get("leased", 0)):
+                break
+            time.sleep(pollSeconds)
+            continue
+
+        task_id, stage, payload = claimed
+        try:
+            stageRunners[stage](config, payload)
+        except (Exception, SystemExit) as e:
+            # create_foldindex_file() calls sys.exit() on HTTP errors
+            print(worker + " failed task " + str(task_id) + ": " + repr(e))
+            lease_held = queue.release(task_id, worker, repr(e))
+        else:
+            lease_held = queue.complete(task_id, worker)
+
+        if not lease_held:
+            print(worker + " lost the lease on task " + str(task_id))
+
+
+def main():
+    """
+    A simple wrapper for all CLI options
+
+    Coordinator, run once:
+        work_queue.py -q <queueDir> --profiles -d <dataDir> --date <date> -c BRCA,KICH [-b]
+        work_queue.py -q <queueDir> --foldindex -f <fastaDir> -o <outputDir>
+    Workers, run on any number of nodes:
+        work_queue.py -q <queueDir> --work -p <processes>
+    Once every task is done or failed, run once:
+        work_queue.py -q <queueDir> --finish
+    """
+    global queueDir
+
+    # Enables command-line options via getopt and sys packages
+    try:
+        opts, args = getopt(sys.argv[1:],
+                            'q:d:c:f:o:p:b',
+                            ["queue=", "dataDir=", "date=", "cancerTypes=",
+                             "fastaDir=", "output=", "processes=", "binary",
+                             "profiles", "foldindex", "work", "status",
+                             "finish"]
+                            )
+    except GetoptError as err:
+        # Redirect STDERR to STDOUT (ensures screen display)
+        sys.stdout = sys.stderr
+        # Print help information
+        print(str(err))
+        # Exit
+        sys.exit(2)
+
+    settings = {"processes": 1}
+    actions = []
+
+    # Configure the action of each CLI option
+    for (opt, arg) in opts:
+        if opt in ("-q", "--queue"):
+            queueDir = arg
+        elif opt in ("-d", "--dataDir"):
+            settings["dataDir"] = arg
+        elif opt == "--date":
+            settings["date"] = arg
+        elif opt in ("-c", "--cancerTypes"):
+            settings["cancerTypes"] = arg.split(',')
+        elif opt in ("-f", "--fastaDir"):
+            settings["fastaDir"] = arg
+        elif opt in ("-o", "--output"):
+            settings["outputDir"] = arg
+        elif opt in ("-p", "--processes"):
+            settings["processes"] = int(arg)
+        elif opt in ("-b", "--binary"):
+            settings["binary"] = True
+        else:
+            actions.append(opt)
+
+    if not queueDir:
+        print("-q/--queue is a required argument")
+        sys.exit(2)
+
+    return settings, actions
+
+
+if __name__ == "__main__":
+    # Run the CLI wrapper to change global variables
+    settings, actions = main()
+
+    if "--profiles" in actions:
+        import create_csv_profile as profile
+        coordinate_profiles(WorkQueue(queueDir),
+                            settings["dataDir"],
+                            settings.get("date", profile.now),
+                            settings.get("cancerTypes", profile.cancerTypes),
+                            settings.get("binary", False))
+
+    if "--foldindex" in actions:
+        coordinate_foldindex(WorkQueue(queueDir),
+                             settings["fastaDir"],
+                             settings["outputDir"])
+
+    if "--work" in actions:
+        # Each process opens its own connection to the queue
+        workers = [Process(target=work, args=(queueDir,))
+                   for _ in range(settings["processes"])]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    if "--finish" in actions:
+        finish(WorkQueue(queueDir))
+
+    if "--status" in actions:
+        for (state, count) in sorted(WorkQueue(queueDir).counts().items()):
+            print(state + ": " + str(count))
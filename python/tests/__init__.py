@@ -0,0 +1,6 @@
+from os import path
+import sys
+
+# The disorder scripts import one another as top-level modules
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "disorder"))
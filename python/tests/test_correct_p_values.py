@@ -0,0 +1,111 @@
+import unittest
+from os import path, makedirs
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import numpy
+from numpy.testing import assert_allclose, assert_array_equal
+
+import correct_p_values
+from correct_p_values import adjust, select_isoforms
+
+# Sorted these are 0.01, 0.03, 0.04, 0.2
+p_values = numpy.array([0.01, 0.04, 0.03, 0.2])
+one_group = numpy.zeros(4, dtype=numpy.int64)
+
+
+class AdjustTest(unittest.TestCase):
+
+    def test_bonferroni(self):
+        assert_allclose(adjust(p_values, one_group, "bonferroni"),
+                        [0.04, 0.16, 0.12, 0.8])
+
+    def test_bonferroni_capped(self):
+        assert_allclose(adjust(numpy.array([0.3, 0.5]),
+                               numpy.zeros(2, dtype=numpy.int64),
+                               "bonferroni"),
+                        [0.6, 1.0])
+
+    def test_bh(self):
+        # p * 4 / rank is 0.04, 0.06, 0.0533, 0.2, then the running minimum
+        # from the largest p-value down
+        assert_allclose(adjust(p_values, one_group, "BH"),
+                        [0.04, 0.16 / 3, 0.16 / 3, 0.2])
+
+    def test_groups_are_adjusted_separately(self):
+        assert_allclose(adjust(numpy.array([0.01, 0.02, 0.01, 0.02]),
+                               numpy.array([0, 0, 1, 1]), "bonferroni"),
+                        [0.02, 0.04, 0.02, 0.04])
+
+    def test_interleaved_groups(self):
+        assert_allclose(adjust(numpy.array([0.04, 0.01, 0.03, 0.02]),
+                               numpy.array([1, 0, 1, 0]), "BH"),
+                        [0.04, 0.02, 0.04, 0.02])
+
+    def test_order_given(self):
+        assert_allclose(adjust(p_values, one_group, "BH",
+                               numpy.argsort(p_values)),
+                        adjust(p_values, one_group, "BH"))
+
+    def test_qvalue_one_tailed_p_values(self):
+        # LOG p-values are the smaller tail, none is above lambda = 0.5
+        # Two-sided they are 0.02, 0.08, 0.06, 0.4, still none above, so
+        # pi0 = (0 + 1) / (4 * 0.5) = 0.5
+        q_values = adjust(p_values, one_group, "qvalue")
+        assert_allclose(q_values, [0.02, 0.08 / 3, 0.08 / 3, 0.1])
+        self.assertTrue(numpy.all(q_values > 0))
+
+    def test_qvalue_pi0_capped(self):
+        # Two-sided 0.6, 0.8, 0.9, 1.0 are all above lambda, pi0 = 2.5 -> 1
+        high = numpy.array([0.3, 0.4, 0.45, 0.5])
+        groups = numpy.zeros(4, dtype=numpy.int64)
+        assert_allclose(adjust(high, groups, "qvalue"),
+                        adjust(high, groups, "BH"))
+
+
+class SelectIsoformsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = mkdtemp()
+        correct_p_values.dataDir = self.data_dir
+        # A1BG.003 has no FASTA, as isoform_length.R would fail to read
+        self.make_refseq("A1BG.001", 30)
+        self.make_refseq("A1BG.002", 20)
+        self.make_refseq("TP53.001", 40)
+
+    def tearDown(self):
+        correct_p_values.dataDir = ""
+        rmtree(self.data_dir)
+
+    def make_refseq(self, isoform, length):
+        refseq_dir = path.join(self.data_dir, correct_p_values.refSeqName)
+        if not path.exists(refseq_dir):
+            makedirs(refseq_dir)
+        with open(path.join(refseq_dir, isoform + ".fasta"), 'w') as FILE:
+            FILE.write(">" + isoform + "\n" + "M" * length + "\n")
+
+    def logs(self, isoforms, mutations):
+        n = len(isoforms)
+        return {"cancer": numpy.zeros(n, dtype=numpy.int32),
+                "lengthClass": numpy.zeros(n, dtype=numpy.int8),
+                "mutations": numpy.array(mutations, dtype=numpy.float64),
+                "pValue": numpy.full(n, 0.5),
+                "direction": numpy.ones(n, dtype=numpy.int8),
+                "isoforms": isoforms,
+                "cancers": ["BRCA"]}
+
+    def test_most_mutations_then_shortest(self):
+        logs = self.logs(["A1BG.001.long", "A1BG.002.long", "TP53.001.long"],
+                         [3, 3, 1])
+        assert_array_equal(select_isoforms(logs), [1, 2])
+
+    def test_missing_refseq_dropped(self):
+        # A1BG.003 wins the tie at length 0, then is dropped like
+        # isoLength == 0 in correction.R
+        logs = self.logs(["A1BG.001.long", "A1BG.003.long", "TP53.001.long"],
+                         [3, 3, 1])
+        assert_array_equal(select_isoforms(logs), [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
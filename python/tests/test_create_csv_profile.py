@@ -0,0 +1,87 @@
+import unittest
+from os import path, makedirs
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import create_csv_profile as profile
+
+# IUPred scores carry 4 decimals, as create_shared_profile() writes them
+iupred = ("# IUPred\n"
+          "# Prediction output\n"
+          "    1 M     0.5011\n"
+          "    2 E     0.0993\n"
+          "    3 E     0.3127\n"
+          "    4 P     1.0000\n")
+
+# Grouped by isoform as in allMuts: two mutations at position 2, one at 4, one
+# past the end of the isoform and one on another isoform
+muts = ("TP53.001\tx\t6\tA\tG\t2\tE\tK\n"
+        "TP53.001\tx\t12\tC\tT\t4\tP\tL\n"
+        "TP53.001\tx\t6\tA\tG\t2\tE\tD\n"
+        "TP53.001\tx\t30\tA\tG\t10\tR\tH\n"
+        "TP53.002\tx\t6\tA\tG\t2\tE\tK\n")
+
+
+class CreateProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = mkdtemp()
+        makedirs(path.join(self.data_dir, profile.allMutsName))
+        makedirs(path.join(self.data_dir, profile.refSeqName, "iupredLong"))
+        with open(path.join(self.data_dir, profile.allMutsName,
+                            "BRCA_mut.txt"), 'w') as FILE:
+            FILE.write(muts)
+        with open(path.join(self.data_dir, profile.refSeqName, "iupredLong",
+                            "TP53.001.long"), 'w') as FILE:
+            FILE.write(iupred)
+
+        profile.dataDir = self.data_dir
+        profile.binaryProfiles = False
+
+    def tearDown(self):
+        rmtree(self.data_dir)
+
+    def read_profile(self, row):
+        with open(row[3], 'rb') as FILE:
+            return FILE.read()
+
+    def test_shared_matches_stream(self):
+        profile.now = "stream"
+        stream_row = profile.create_csv_profile(("BRCA_mut.txt",
+                                                 "TP53.001.long"))
+
+        profile.now = "shared"
+        tasks = profile.load_shared_data("BRCA")
+        self.assertEqual(len(tasks), 1)
+        shared_row = profile.create_shared_profile(tasks[0])
+
+        self.assertEqual(self.read_profile(shared_row),
+                         self.read_profile(stream_row))
+        self.assertEqual(self.read_profile(stream_row),
+                         "1\tM\t0.5011\t0\r\n2\tE\t0.0993\t2\r\n"
+                         "3\tE\t0.3127\t0\r\n4\tP\t1.0000\t1\r\n")
+
+        # Same catalog row but for the date in the profile path
+        self.assertEqual(shared_row[:3] + shared_row[4:],
+                         stream_row[:3] + stream_row[4:])
+        self.assertEqual(stream_row[4:], (4, 3))
+
+    def test_binary_stream_matches_shared(self):
+        profile.binaryProfiles = True
+
+        profile.now = "stream"
+        stream_row = profile.create_csv_profile(("BRCA_mut.txt",
+                                                 "TP53.001.long"))
+        self.assertTrue(stream_row[3].endswith(profile.binaryExtension))
+
+        profile.now = "shared"
+        tasks = profile.load_shared_data("BRCA")
+        shared_row = profile.create_shared_profile(tasks[0])
+
+        self.assertEqual(self.read_profile(shared_row),
+                         self.read_profile(stream_row))
+        self.assertEqual(stream_row[4:], (4, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from os import path
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from numpy.testing import assert_array_equal, assert_allclose
+
+from profile_codec import encode_profile, decode_profile, write_profile, \
+    load_columns, profile_lines, isoform_profiles, header
+
+
+class ProfileCodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def assert_round_trip(self, positions, residues, scores, muts):
+        profile = decode_profile(encode_profile(positions, residues, scores,
+                                                muts))
+        assert_array_equal(profile["position"], positions)
+        self.assertEqual(profile["residue"].tostring(), residues)
+        assert_allclose(profile["score"], scores)
+        assert_array_equal(profile["muts"], muts)
+        return profile
+
+    def test_consecutive_positions(self):
+        data = encode_profile([1, 2, 3], "MEE", [0.1234, 0.5, 1.0], [0, 2, 0])
+        # Implicit positions and one mutated row: 3 residues, 3 scores, 1 pair
+        self.assertEqual(len(data), header.size + 3 + 2 * 3 + 4 + 4)
+        self.assert_round_trip([1, 2, 3], "MEE", [0.1234, 0.5, 1.0],
+                               [0, 2, 0])
+
+    def test_non_consecutive_positions(self):
+        self.assert_round_trip([5, 6, 9, 20], "MKLV",
+                               [0.0, 0.9999, 0.25, 0.3333], [1, 0, 0, 3])
+
+    def test_single_row(self):
+        self.assert_round_trip([7], "M", [0.5], [0])
+
+    def test_empty(self):
+        profile = self.assert_round_trip([], "", [], [])
+        self.assertEqual(len(profile["position"]), 0)
+
+    def test_scores_quantized_to_4_decimals(self):
+        profile = decode_profile(encode_profile([1], "M", [0.12344], [0]))
+        assert_allclose(profile["score"], [0.1234])
+
+    def test_not_a_profile(self):
+        self.assertRaises(ValueError, decode_profile, "x" * header.size)
+
+    def test_profile_lines_match_text(self):
+        text_file = path.join(self.tmp_dir, "A1BG.001.long.prof")
+        binary_file = path.join(self.tmp_dir, "A1BG.001.long.bprof")
+        with open(text_file, 'w') as FILE:
+            FILE.write("1\tM\t0.1234\t0\r\n2\tS\t0.5000\t2\r\n")
+        write_profile(binary_file, [1, 2], "MS", [0.1234, 0.5], [0, 2])
+
+        self.assertEqual(list(profile_lines(binary_file)),
+                         list(profile_lines(text_file)))
+        for (binary, text) in zip(load_columns(binary_file),
+                                  load_columns(text_file)):
+            assert_allclose(binary, text)
+
+    def test_load_columns_empty_text(self):
+        empty_file = path.join(self.tmp_dir, "A1BG.001.long.prof")
+        open(empty_file, 'w').close()
+        self.assertEqual([len(column) for column in load_columns(empty_file)],
+                         [0, 0, 0])
+
+    def test_isoform_profiles_one_per_isoform(self):
+        names = [fname for (fname, _) in isoform_profiles(
+            ["A1BG.002.long.prof", "A1BG.001.long.prof",
+             "A1BG.001.long.bprof", "A1BG.long.prof", "BRCA.prof"])]
+        self.assertEqual(names, ["A1BG.001.long.bprof", "A1BG.002.long.prof"])
+
+
+if __name__ == "__main__":
+    unittest.main()
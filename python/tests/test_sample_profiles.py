@@ -0,0 +1,76 @@
+import random
+import unittest
+from os import path, makedirs
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from numpy.testing import assert_array_equal
+
+import sample_profiles
+from sample_profiles import chunk_rng, generate_chunks, sample_chunk, \
+    write_log
+
+
+class SampleProfilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        sample_profiles.dataDir = path.join(self.tmp_dir, "data")
+        sample_profiles.outputsDir = path.join(self.tmp_dir, "outputs")
+        sample_profiles.now = "01-01-17"
+        sample_profiles.number = 1000
+        sample_profiles.chunkSamples = 100
+        sample_profiles.cachedProfile = (None, None, None)
+
+        gene_dir = path.join(sample_profiles.dataDir, "profiles", "01-01-17",
+                             "BRCA", "TP53.long")
+        makedirs(gene_dir)
+        with open(path.join(gene_dir, "TP53.001.long.prof"), 'w') as FILE:
+            FILE.write("1\tM\t0.1234\t0\r\n2\tE\t0.9000\t2\r\n"
+                       "3\tE\t0.3127\t0\r\n4\tP\t0.0501\t1\r\n")
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def draw(self, ctype, isoform, chunk):
+        return chunk_rng(ctype, isoform, chunk).randint(0, 1000, size=20)
+
+    def test_chunk_rng_reproducible(self):
+        assert_array_equal(self.draw("BRCA", "TP53.001.long", 3),
+                           self.draw("BRCA", "TP53.001.long", 3))
+
+    def test_chunk_rng_independent(self):
+        stream = self.draw("BRCA", "TP53.001.long", 3)
+        for other in [self.draw("BRCA", "TP53.001.long", 4),
+                      self.draw("KICH", "TP53.001.long", 3),
+                      self.draw("BRCA", "TP53.002.long", 3)]:
+            self.assertFalse((stream == other).all())
+
+        sample_profiles.now = "02-01-17"
+        self.assertFalse((stream == self.draw("BRCA", "TP53.001.long",
+                                              3)).all())
+
+    def read_log(self, results):
+        log_file = write_log(results[0][0], results)[3]
+        with open(log_file, 'r') as FILE:
+            return FILE.read()
+
+    def test_merge_order_independent(self):
+        tasks = list(generate_chunks("BRCA"))
+        self.assertEqual(len(tasks), 10)
+
+        results = [sample_chunk(task) for task in tasks]
+        log = self.read_log(results)
+        self.assertTrue(log.startswith("TP53.001.long,1.8501,"))
+
+        # Chunks computed and merged in another order, by a fresh worker
+        shuffled = list(reversed(tasks))
+        random.Random(7).shuffle(shuffled)
+        for order in [list(reversed(tasks)), shuffled]:
+            sample_profiles.cachedProfile = (None, None, None)
+            self.assertEqual(self.read_log([sample_chunk(task)
+                                            for task in order]), log)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import time
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from work_queue import WorkQueue, run_profile
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.queue_dir)
+
+    def test_claim_in_order_once(self):
+        queue = WorkQueue(self.queue_dir)
+        queue.put("profile", [["a", "1"], ["b", "2"]])
+
+        self.assertEqual(queue.claim("w1")[1:], ("profile", ["a", "1"]))
+        self.assertEqual(queue.claim("w2")[1:], ("profile", ["b", "2"]))
+        self.assertIsNone(queue.claim("w3"))
+        self.assertEqual(queue.counts(), {"leased": 2})
+
+    def test_complete(self):
+        queue = WorkQueue(self.queue_dir)
+        queue.put("profile", [["a"]])
+
+        task_id = queue.claim("w1")[0]
+        self.assertTrue(queue.complete(task_id, "w1"))
+        self.assertEqual(queue.counts(), {"done": 1})
+        self.assertIsNone(queue.claim("w1"))
+
+    def test_expired_lease_is_reclaimed(self):
+        queue = WorkQueue(self.queue_dir, lease=0.01)
+        queue.put("profile", [["a"]])
+
+        task_id = queue.claim("w1")[0]
+        time.sleep(0.05)
+        self.assertEqual(queue.claim("w2")[0], task_id)
+
+        # The first worker finishing late cannot touch the new lease
+        self.assertFalse(queue.complete(task_id, "w1"))
+        self.assertFalse(queue.release(task_id, "w1", "late"))
+        self.assertEqual(queue.counts(), {"leased": 1})
+
+        self.assertTrue(queue.complete(task_id, "w2"))
+        self.assertEqual(queue.counts(), {"done": 1})
+
+    def test_release_retries_then_fails(self):
+        queue = WorkQueue(self.queue_dir, attempts=2)
+        queue.put("profile", [["a"]])
+
+        task_id = queue.claim("w1")[0]
+        self.assertTrue(queue.release(task_id, "w1", "first"))
+        self.assertEqual(queue.counts(), {"pending": 1})
+
+        self.assertEqual(queue.claim("w2")[0], task_id)
+        self.assertTrue(queue.release(task_id, "w2", "second"))
+        self.assertEqual(queue.counts(), {"failed": 1})
+        self.assertIsNone(queue.claim("w3"))
+
+    def test_expired_final_attempt_fails(self):
+        queue = WorkQueue(self.queue_dir, lease=0.01, attempts=1)
+        queue.put("profile", [["a"]])
+
+        queue.claim("w1")
+        time.sleep(0.05)
+        self.assertIsNone(queue.claim("w2"))
+        self.assertEqual(queue.counts(), {"failed": 1})
+
+    def test_missing_inputs_raise(self):
+        # create_csv_profile() only prints when its inputs cannot be opened
+        config = {"dataDir": self.queue_dir, "date": "01-01-17"}
+        self.assertRaises(IOError, run_profile, config,
+                          ["BRCA_mut.txt", "TP53.001.long"])
+
+
+if __name__ == "__main__":
+    unittest.main()